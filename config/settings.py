@@ -52,6 +52,7 @@ MIDDLEWARE = [
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
+    'doctors.middleware.ConditionalDirectoryMiddleware',  # ETag/304 for public pages
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
 
@@ -161,6 +162,33 @@ LOGIN_URL = 'doctors:login'
 LOGIN_REDIRECT_URL = 'doctors:index'
 LOGOUT_REDIRECT_URL = 'doctors:index'
 
+# Analytics (doctors/tracking.py, doctors/analytics.py)
+ANALYTICS_FLUSH_INTERVAL = config('ANALYTICS_FLUSH_INTERVAL', default=5, cast=int)  # seconds
+ANALYTICS_DEDUPE_USE_CACHE = config('ANALYTICS_DEDUPE_USE_CACHE', default=False, cast=bool)
+ANALYTICS_RETENTION_DAYS = config('ANALYTICS_RETENTION_DAYS', default=90, cast=int)  # raw view/search rows
+
+# Cache shared by all gunicorn workers (search results, page cache, locks).
+# It must be shared by every process and have an atomic add(): the database
+# cache (run `python manage.py createcachetable` once) or Redis
+# (CACHE_BACKEND=django.core.cache.backends.redis.RedisCache,
+# CACHE_LOCATION=redis://127.0.0.1:6379/1, needs `pip install redis`).
+# Not the file cache (add() is not atomic) or locmem (one per process).
+CACHE_BACKEND = config('CACHE_BACKEND', default='django.core.cache.backends.db.DatabaseCache')
+CACHES = {
+    'default': {
+        'BACKEND': CACHE_BACKEND,
+        'LOCATION': config('CACHE_LOCATION', default='doctors_cache'),
+    }
+}
+if CACHE_BACKEND.endswith('DatabaseCache'):
+    CACHES['default']['OPTIONS'] = {'MAX_ENTRIES': 10000}  # pages + doctor fragments
+PAGE_CACHE_TIMEOUT = config('PAGE_CACHE_TIMEOUT', default=300, cast=int)  # seconds, anonymous pages
+
+# Live updates on the emergency page - needs an ASGI server
+# (gunicorn -k uvicorn.workers.UvicornWorker config.asgi:application) and an
+# unbuffered proxy location for /emergency/live/, see CONTABO_VPS_DEPLOYMENT.md
+DUTY_BOARD_STREAM = config('DUTY_BOARD_STREAM', default=False, cast=bool)
+
 # CSRF/CORS Settings
 CSRF_TRUSTED_ORIGINS = [
     'https://tangaildoctors.com',
@@ -119,6 +119,8 @@ fi
 # Run migrations
 echo "🗄️  Running database migrations..."
 python manage.py migrate --noinput
+python manage.py createcachetable
+python manage.py refresh_availability_timeline
 
 # Collect static files
 echo "📦 Collecting static files..."
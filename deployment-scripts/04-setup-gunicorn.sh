@@ -32,6 +32,15 @@ ListenStream=/run/gunicorn.sock
 WantedBy=sockets.target
 EOF
 
+# The live duty board (DUTY_BOARD_STREAM) needs the ASGI app on Uvicorn workers
+WORKER_ARGS=""
+APP_MODULE="config.wsgi:application"
+if grep -qiE '^DUTY_BOARD_STREAM=(true|1|yes|on)' "$PROJECT_DIR/.env" 2>/dev/null; then
+    echo "📡 DUTY_BOARD_STREAM is on - using Uvicorn workers (config.asgi)"
+    WORKER_ARGS="-k uvicorn.workers.UvicornWorker "
+    APP_MODULE="config.asgi:application"
+fi
+
 # Create Gunicorn service file
 echo "⚙️  Creating Gunicorn service..."
 cat > /etc/systemd/system/gunicorn.service <<EOF
@@ -48,13 +57,13 @@ WorkingDirectory=$PROJECT_DIR
 Environment="PATH=$PROJECT_DIR/venv/bin"
 EnvironmentFile=$PROJECT_DIR/.env
 ExecStart=$PROJECT_DIR/venv/bin/gunicorn \\
-          --workers 3 \\
+          ${WORKER_ARGS}--workers 3 \\
           --timeout 120 \\
           --bind unix:/run/gunicorn.sock \\
           --access-logfile /var/log/gunicorn/access.log \\
           --error-logfile /var/log/gunicorn/error.log \\
           --log-level info \\
-          config.wsgi:application
+          $APP_MODULE
 
 ExecReload=/bin/kill -s HUP \$MAINPID
 KillMode=mixed
@@ -47,6 +47,20 @@ server {
         add_header Cache-Control "public";
     }
     
+    # Live duty board (Server-Sent Events) - must not be buffered
+    location /emergency/live/ {
+        proxy_pass http://tangail_doctors;
+        proxy_http_version 1.1;
+        proxy_set_header Connection '';
+        proxy_set_header Host $host;
+        proxy_set_header X-Real-IP $remote_addr;
+        proxy_set_header X-Forwarded-For $proxy_add_x_forwarded_for;
+        proxy_set_header X-Forwarded-Proto $scheme;
+        proxy_buffering off;
+        proxy_cache off;
+        proxy_read_timeout 1h;
+    }
+    
     # Proxy to Gunicorn
     location / {
         proxy_pass http://tangail_doctors;
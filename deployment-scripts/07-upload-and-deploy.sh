@@ -29,6 +29,8 @@ pip install -r requirements.txt
 # Run migrations
 echo "🗄️  Running migrations..."
 python manage.py migrate --noinput
+python manage.py createcachetable
+python manage.py refresh_availability_timeline
 
 # Compile translations
 echo "🌐 Compiling translations..."
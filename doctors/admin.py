@@ -1,6 +1,10 @@
+from datetime import date, timedelta
 from django.contrib import admin
+from django.contrib.admin.views.main import ChangeList
 from django.utils.translation import gettext_lazy as _
-from .models import Doctor, Favorite, Review, TimeSlot, Appointment, Category, CategoryKeyword, DoctorView, SearchQuery, DailyStats, EmergencySchedule, DoctorLeave
+from .availability import attach_availability
+from .leaves import leave_index
+from .models import Doctor, Favorite, Review, TimeSlot, Appointment, Category, CategoryKeyword, DoctorView, SearchQuery, SearchQueryDaily, DailyStats, EmergencySchedule, DoctorLeave, AvailabilityInterval
 
 
 class EmergencyScheduleInline(admin.TabularInline):
@@ -19,10 +23,57 @@ class DoctorLeaveInline(admin.TabularInline):
     ordering = ['-start_date']
 
 
+class LeavePeriodFilter(admin.SimpleListFilter):
+    """নির্দিষ্ট সময়ে কারা ছুটিতে - leave index থেকে, প্রতি সারিতে query ছাড়া"""
+    title = 'ছুটির সময়'
+    parameter_name = 'away'
+    
+    # value -> (label, first day offset, last day offset)
+    PERIODS = {
+        'today': ('আজ', 0, 0),
+        'week': ('আগামী ৭ দিন', 0, 6),
+        'next_week': ('পরের সপ্তাহ', 7, 13),
+        'month': ('আগামী ৩০ দিন', 0, 29),
+    }
+    
+    def lookups(self, request, model_admin):
+        return [(value, label) for value, (label, _, _) in self.PERIODS.items()]
+    
+    def away(self):
+        """{doctor_id: [LeaveSpan, ...]} of the selected period"""
+        _, first, last = self.PERIODS[self.value()]
+        today = date.today()
+        return leave_index.leaves_between(today + timedelta(days=first), today + timedelta(days=last))
+    
+    def queryset(self, request, queryset):
+        if self.value() not in self.PERIODS:
+            return queryset
+        return queryset.filter(pk__in=list(self.away()))
+
+
+class LeaveRowPeriodFilter(LeavePeriodFilter):
+    """ছুটির তালিকায় - নির্বাচিত সময়ের সাথে মিলে যাওয়া ছুটিগুলো"""
+    def queryset(self, request, queryset):
+        if self.value() not in self.PERIODS:
+            return queryset
+        return queryset.filter(pk__in=[leave.pk for leaves in self.away().values() for leave in leaves])
+
+
+class DoctorChangeList(ChangeList):
+    """পেজের সব ডাক্তারের বর্তমান অবস্থা ও আজকের ছুটি একবারে লোড করে"""
+    def get_results(self, request):
+        super().get_results(request)
+        # Evaluates (and caches) the page queryset - list_editable still gets a queryset
+        attach_availability(self.result_list)
+        leaves = leave_index.leaves_on(date.today(), [doctor.pk for doctor in self.result_list])
+        for doctor in self.result_list:
+            doctor._current_leave = leaves.get(doctor.pk)
+
+
 @admin.register(Doctor)
 class DoctorAdmin(admin.ModelAdmin):
-    list_display = ['name', 'name_en', 'specialty_short', 'hospital', 'get_category', 'get_categories_list', 'is_emergency_available', 'is_24_7_available', 'available_now_status', 'view_count', 'is_active', 'created_at']
-    list_filter = ['is_active', 'is_emergency_available', 'is_24_7_available', 'hospital', 'created_at', 'categories', 'primary_category']
+    list_display = ['name', 'name_en', 'specialty_short', 'hospital', 'get_category', 'get_categories_list', 'is_emergency_available', 'is_24_7_available', 'available_now_status', 'leave_status', 'view_count', 'is_active', 'created_at']
+    list_filter = ['is_active', 'is_emergency_available', 'is_24_7_available', LeavePeriodFilter, 'hospital', 'created_at', 'categories', 'primary_category']
     search_fields = ['name', 'name_en', 'specialty', 'specialty_en', 'hospital', 'hospital_en', 'qualification', 'contact', 'hospital_address', 'emergency_phone']
     list_editable = ['is_active', 'is_emergency_available', 'is_24_7_available']
     date_hierarchy = 'created_at'
@@ -61,9 +112,13 @@ class DoctorAdmin(admin.ModelAdmin):
     
     actions = ['auto_assign_categories_action']
     
+    def get_changelist(self, request, **kwargs):
+        return DoctorChangeList
+    
     def specialty_short(self, obj):
         """বিশেষত্ব সংক্ষিপ্ত"""
-        return obj.get_clean_specialty()[:50] + '...' if len(obj.get_clean_specialty()) > 50 else obj.get_clean_specialty()
+        specialty = obj.clean_specialty
+        return specialty[:50] + '...' if len(specialty) > 50 else specialty
     specialty_short.short_description = 'বিশেষত্ব'
     
     def get_category(self, obj):
@@ -87,6 +142,14 @@ class DoctorAdmin(admin.ModelAdmin):
         return f'🔴 {next_time}'
     available_now_status.short_description = 'বর্তমান অবস্থা'
     
+    def leave_status(self, obj):
+        """আজ ছুটিতে আছে কিনা"""
+        leave = getattr(obj, '_current_leave', None)
+        if leave is None:
+            return '-'
+        return f'🔴 {leave.end_date:%d/%m} পর্যন্ত'
+    leave_status.short_description = 'ছুটি'
+    
     def auto_assign_categories_action(self, request, queryset):
         """Bulk action: স্বয়ংক্রিয় ক্যাটেগরি নির্ধারণ"""
         count = 0
@@ -295,13 +358,27 @@ class SearchQueryAdmin(admin.ModelAdmin):
         return False
 
 
+@admin.register(SearchQueryDaily)
+class SearchQueryDailyAdmin(admin.ModelAdmin):
+    list_display = ['date', 'query', 'count']
+    search_fields = ['query']
+    date_hierarchy = 'date'
+    readonly_fields = ['date', 'query', 'count']
+    ordering = ['-date', '-count']
+    list_per_page = 100
+    
+    def has_add_permission(self, request):
+        """Don't allow manual addition - filled by compact_analytics command"""
+        return False
+
+
 @admin.register(DailyStats)
 class DailyStatsAdmin(admin.ModelAdmin):
-    list_display = ['date', 'total_views', 'unique_visitors', 'total_searches', 'unique_searches', 'most_viewed_doctor', 'most_searched_term']
-    list_filter = ['date']
+    list_display = ['date', 'total_views', 'unique_visitors', 'total_searches', 'unique_searches', 'most_viewed_doctor', 'most_searched_term', 'is_compacted']
+    list_filter = ['date', 'is_compacted']
     search_fields = ['most_searched_term', 'most_viewed_doctor__name']
     date_hierarchy = 'date'
-    readonly_fields = ['date', 'total_views', 'unique_visitors', 'total_searches', 'unique_searches', 'most_viewed_doctor', 'most_searched_term']
+    readonly_fields = ['date', 'total_views', 'unique_visitors', 'total_searches', 'unique_searches', 'most_viewed_doctor', 'most_searched_term', 'is_compacted']
     ordering = ['-date']
     list_per_page = 100
     
@@ -355,7 +432,7 @@ class EmergencyScheduleAdmin(admin.ModelAdmin):
 class DoctorLeaveAdmin(admin.ModelAdmin):
     """ডাক্তার ছুটি Admin"""
     list_display = ['doctor', 'start_date', 'end_date', 'duration_days', 'is_emergency_available', 'is_on_leave_now', 'created_at']
-    list_filter = ['is_emergency_available', 'start_date', 'end_date', 'created_at']
+    list_filter = [LeaveRowPeriodFilter, 'is_emergency_available', 'start_date', 'end_date', 'created_at']
     search_fields = ['doctor__name', 'reason']
     date_hierarchy = 'start_date'
     ordering = ['-start_date']
@@ -386,3 +463,18 @@ class DoctorLeaveAdmin(admin.ModelAdmin):
             return '🔴 ছুটিতে আছেন'
         return '🟢 কর্মরত'
     is_on_leave_now.short_description = 'বর্তমান অবস্থা'
+
+
+@admin.register(AvailabilityInterval)
+class AvailabilityIntervalAdmin(admin.ModelAdmin):
+    """উপলব্ধ সময় Admin - শুধু দেখার জন্য"""
+    list_display = ['doctor', 'starts_at', 'ends_at']
+    search_fields = ['doctor__name']
+    date_hierarchy = 'starts_at'
+    readonly_fields = ['doctor', 'starts_at', 'ends_at']
+    ordering = ['starts_at', 'doctor']
+    list_per_page = 100
+    
+    def has_add_permission(self, request):
+        """Don't allow manual addition - built from schedules and leaves"""
+        return False
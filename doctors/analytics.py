@@ -0,0 +1,282 @@
+# -*- coding: utf-8 -*-
+"""
+Analytics rollups and raw-event retention
+
+Raw DoctorView / SearchQuery rows are only kept for ANALYTICS_RETENTION_DAYS.
+Older days are compacted into DailyStats, DoctorViewHourly and
+SearchQueryDaily and then deleted, one day (one transaction) at a time.
+Unique visitors / search terms live in mergeable per-day HyperLogLog
+sketches and the most searched terms in per-day SpaceSaving summaries
+(DailySketch), so they survive the purge and can be read for any date range.
+"""
+from collections import Counter
+from datetime import datetime, time, timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count
+from django.db.models.functions import TruncDate, TruncHour
+from django.utils import timezone
+
+
+RETENTION_DAYS = getattr(settings, 'ANALYTICS_RETENTION_DAYS', 90)
+PURGE_BATCH_SIZE = 1000
+
+
+def day_range(day):
+    """Aware [start, end) datetimes of a local calendar day"""
+    start = timezone.make_aware(datetime.combine(day, time.min))
+    end = timezone.make_aware(datetime.combine(day + timedelta(days=1), time.min))
+    return start, end
+
+
+def retention_cutoff(days=None):
+    """First local day whose raw events are kept"""
+    return timezone.localdate() - timedelta(days=RETENTION_DAYS if days is None else days)
+
+
+def normalize_search_term(query):
+    """Search terms are compared case-insensitively with collapsed whitespace"""
+    return ' '.join(query.split()).casefold()
+
+
+def search_term_counts(searches):
+    """Counter of the normalized terms of SearchQuery rows - every rollup groups on this key"""
+    counts = Counter()
+    for query in searches.values_list('query', flat=True).iterator():
+        counts[normalize_search_term(query)] += 1
+    counts.pop('', None)
+    return counts
+
+
+def merge_sketches(kind, sketches):
+    """Merge {(day, doctor_id or None): HyperLogLog} into the stored DailySketch rows"""
+    from .models import DailySketch
+
+    # Sorted so concurrent flushes from other workers lock rows in the same order
+    for (day, doctor_id), sketch in sorted(sketches.items(), key=lambda item: (item[0][0], item[0][1] or 0)):
+        with transaction.atomic():
+            row, created = DailySketch.objects.select_for_update().get_or_create(
+                date=day, kind=kind, doctor_id=doctor_id,
+                defaults={'data': sketch.to_bytes()},
+            )
+            if not created:
+                row.data = sketch.merge(row.sketch).to_bytes()
+                row.save(update_fields=['data'])
+
+
+def merged_sketch(kind, date_from, date_to, doctor=None):
+    """
+    Union of the daily sketches between two local days (inclusive)
+    Site-wide unless `doctor` is given; None when no sketch exists
+    """
+    from .models import DailySketch
+
+    rows = DailySketch.objects.filter(kind=kind, date__gte=date_from, date__lte=date_to)
+    rows = rows.filter(doctor=doctor) if doctor is not None else rows.filter(doctor__isnull=True)
+    merged = None
+    for row in rows.only('kind', 'data'):
+        sketch = row.sketch
+        merged = sketch if merged is None else merged.merge(sketch)
+    return merged
+
+
+def count_unique_visitors(date_from, date_to, doctor=None):
+    """Estimated unique visitors between two local days (inclusive), site-wide or of one doctor"""
+    from .models import DailySketch
+
+    sketch = merged_sketch(DailySketch.VISITORS, date_from, date_to, doctor)
+    return sketch.count() if sketch else 0
+
+
+def count_unique_search_terms(date_from, date_to):
+    """Estimated distinct search terms between two local days (inclusive)"""
+    from .models import DailySketch
+
+    sketch = merged_sketch(DailySketch.SEARCH_TERMS, date_from, date_to)
+    return sketch.count() if sketch else 0
+
+
+def top_search_terms(date_from, date_to, limit=10):
+    """[(term, estimated count)] of the most searched terms between two local days (inclusive)"""
+    from .models import DailySketch
+
+    sketch = merged_sketch(DailySketch.TOP_SEARCH_TERMS, date_from, date_to)
+    return sketch.top(limit) if sketch else []
+
+
+def rebuild_search_sketches(day):
+    """
+    Recompute the search term sketches of one (local) day from SearchQuery rows,
+    or from the SearchQueryDaily rollup once they are compacted
+    """
+    from .models import DailySketch, SearchQuery, SearchQueryDaily
+    from .sketches import HyperLogLog, SpaceSaving
+
+    start, end = day_range(day)
+    counts = search_term_counts(SearchQuery.objects.filter(searched_at__gte=start, searched_at__lt=end))
+    for query, count in SearchQueryDaily.objects.filter(date=day).values_list('query', 'count'):
+        counts[normalize_search_term(query)] += count
+    counts.pop('', None)
+
+    terms, top = HyperLogLog(), SpaceSaving()
+    for term, count in counts.items():
+        terms.add(term)
+        top.add(term, count)
+
+    with transaction.atomic():
+        DailySketch.objects.filter(date=day, doctor__isnull=True, kind__in=[
+            DailySketch.SEARCH_TERMS, DailySketch.TOP_SEARCH_TERMS
+        ]).delete()
+        if counts:
+            DailySketch.objects.bulk_create([
+                DailySketch(date=day, kind=DailySketch.SEARCH_TERMS, data=terms.to_bytes()),
+                DailySketch(date=day, kind=DailySketch.TOP_SEARCH_TERMS, data=top.to_bytes()),
+            ])
+
+
+def aggregate_daily_stats(day):
+    """
+    Compute and store DailyStats of one (local) day
+    Unique counts come from the day's sketches, or the raw tables for days without one
+    """
+    from .models import DailySketch, DailyStats, DoctorView, SearchQuery
+
+    start, end = day_range(day)
+
+    views = DoctorView.objects.filter(viewed_at__gte=start, viewed_at__lt=end)
+    view_totals = views.aggregate(
+        total=Count('id'),
+        unique=Count('session_key', distinct=True),
+    )
+    top_doctor = views.values('doctor').annotate(
+        count=Count('id')
+    ).order_by('-count', 'doctor').values_list('doctor', flat=True).first()
+
+    searches = SearchQuery.objects.filter(searched_at__gte=start, searched_at__lt=end)
+    terms = search_term_counts(searches)
+    search_totals = {'total': searches.count(), 'unique': len(terms)}
+    top_term = min(terms.items(), key=lambda entry: (-entry[1], entry[0]))[0] if terms else None
+
+    visitors = merged_sketch(DailySketch.VISITORS, day, day)
+    if visitors is not None:
+        view_totals['unique'] = visitors.count()
+    search_terms = merged_sketch(DailySketch.SEARCH_TERMS, day, day)
+    if search_terms is not None:
+        search_totals['unique'] = search_terms.count()
+    top_terms = top_search_terms(day, day, limit=1)
+    if top_terms:
+        top_term = top_terms[0][0]
+
+    stats, _ = DailyStats.objects.update_or_create(
+        date=day,
+        defaults={
+            'total_views': view_totals['total'],
+            'unique_visitors': view_totals['unique'],
+            'total_searches': search_totals['total'],
+            'unique_searches': search_totals['unique'],
+            'most_viewed_doctor_id': top_doctor,
+            'most_searched_term': top_term or '',
+        },
+    )
+    return stats
+
+
+def rebuild_hourly_views(start=None, end=None):
+    """Recompute DoctorViewHourly buckets in [start, end) from raw DoctorView rows"""
+    from .models import DoctorView, DoctorViewHourly
+
+    views = DoctorView.objects.all()
+    buckets = DoctorViewHourly.objects.all()
+    if start is not None:
+        views = views.filter(viewed_at__gte=start)
+        buckets = buckets.filter(hour__gte=start)
+    if end is not None:
+        views = views.filter(viewed_at__lt=end)
+        buckets = buckets.filter(hour__lt=end)
+
+    rows = views.annotate(
+        bucket=TruncHour('viewed_at')
+    ).values('doctor', 'bucket').annotate(
+        count=Count('id')
+    ).order_by().values_list('doctor', 'bucket', 'count')
+
+    with transaction.atomic():
+        buckets.delete()
+        created = DoctorViewHourly.objects.bulk_create(
+            [DoctorViewHourly(doctor_id=doctor_id, hour=hour, views=count) for doctor_id, hour, count in rows],
+            batch_size=PURGE_BATCH_SIZE,
+        )
+    return len(created)
+
+
+def rollup_searches(day):
+    """Recompute SearchQueryDaily rows of one (local) day from raw SearchQuery rows"""
+    from .models import SearchQuery, SearchQueryDaily
+
+    start, end = day_range(day)
+    counts = search_term_counts(SearchQuery.objects.filter(searched_at__gte=start, searched_at__lt=end))
+
+    with transaction.atomic():
+        SearchQueryDaily.objects.filter(date=day).delete()
+        SearchQueryDaily.objects.bulk_create(
+            [SearchQueryDaily(date=day, query=term, count=count) for term, count in counts.items()],
+            batch_size=PURGE_BATCH_SIZE,
+        )
+
+
+def _delete_in_batches(queryset, batch_size):
+    """Delete in short transactions, so locks are held for one batch only"""
+    deleted = 0
+    while True:
+        with transaction.atomic():
+            ids = list(queryset.values_list('pk', flat=True)[:batch_size])
+            if not ids:
+                return deleted
+            deleted += queryset.model.objects.filter(pk__in=ids).delete()[0]
+
+
+def compact_day(day, batch_size=PURGE_BATCH_SIZE):
+    """
+    Roll one day of raw events into the aggregate tables and delete them
+    The rollups commit first and mark the day compacted, so a run
+    interrupted while deleting resumes with the deletes instead of
+    re-aggregating the rows that are left.
+    Returns (views deleted, searches deleted)
+    """
+    from .models import DailyStats, DoctorView, SearchQuery
+
+    start, end = day_range(day)
+    if not DailyStats.objects.filter(date=day, is_compacted=True).exists():
+        with transaction.atomic():
+            aggregate_daily_stats(day)
+            rebuild_hourly_views(start, end)
+            rollup_searches(day)
+            DailyStats.objects.filter(date=day).update(is_compacted=True)
+
+    views = _delete_in_batches(DoctorView.objects.filter(viewed_at__gte=start, viewed_at__lt=end), batch_size)
+    searches = _delete_in_batches(SearchQuery.objects.filter(searched_at__gte=start, searched_at__lt=end), batch_size)
+    return views, searches
+
+
+def raw_days(date_from=None, date_to=None):
+    """Local days in [date_from, date_to) that still have raw events"""
+    from .models import DoctorView, SearchQuery
+
+    views = DoctorView.objects.all()
+    searches = SearchQuery.objects.all()
+    if date_from is not None:
+        views = views.filter(viewed_at__gte=day_range(date_from)[0])
+        searches = searches.filter(searched_at__gte=day_range(date_from)[0])
+    if date_to is not None:
+        views = views.filter(viewed_at__lt=day_range(date_to)[0])
+        searches = searches.filter(searched_at__lt=day_range(date_to)[0])
+
+    tzinfo = timezone.get_current_timezone()
+    days = set(views.annotate(
+        day=TruncDate('viewed_at', tzinfo=tzinfo)
+    ).order_by().values_list('day', flat=True).distinct())
+    days.update(searches.annotate(
+        day=TruncDate('searched_at', tzinfo=tzinfo)
+    ).order_by().values_list('day', flat=True).distinct())
+    return sorted(days)
@@ -0,0 +1,205 @@
+# -*- coding: utf-8 -*-
+"""
+Emergency availability engine
+
+The weekly EmergencySchedule rows, the doctor flags and the leaves are
+materialized into AvailabilityInterval rows: concrete on-duty intervals
+for today and the next seven days, with blocking leave days left out and
+full days for 24/7 doctors. "Available now" and "next available time" are
+then a single indexed range lookup, answered for a whole page of doctors
+at once. The timeline is rebuilt per doctor by signals and in full once a
+day by the refresh_availability_timeline cron command. A missed run only
+shortens the horizon; only when no build covers today (fresh deploy, cron
+not set up) does one request rebuild the whole horizon. Uses the same
+local clock (datetime.now()) as the rest of the emergency system.
+"""
+import logging
+from bisect import bisect_right
+from collections import defaultdict
+from datetime import datetime, time, timedelta
+
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+
+DAY_NAMES = ['সোমবার', 'মঙ্গলবার', 'বুধবার', 'বৃহস্পতিবার', 'শুক্রবার', 'শনিবার', 'রবিবার']
+
+# Today + the next 7 days, so "next available" finds next week's same weekday
+TIMELINE_DAYS = 8
+# Last local day (ISO date) the materialized timeline is known to cover
+TIMELINE_COVERED_CACHE_KEY = 'doctors:timeline_covers_until'
+TIMELINE_LOCK_CACHE_KEY = 'doctors:timeline_rebuilding'
+
+logger = logging.getLogger(__name__)
+
+
+def to_aware(value):
+    """Local naive datetime (datetime.now()) -> aware datetime for queries"""
+    return timezone.make_aware(value) if timezone.is_naive(value) else value
+
+
+def to_local(value):
+    """Stored aware datetime -> local naive datetime"""
+    return timezone.localtime(value).replace(tzinfo=None)
+
+
+def build_intervals(doctors, schedules, leaves, start_day, days=TIMELINE_DAYS):
+    """
+    (doctor_id, starts_at, ends_at) local naive intervals of `days` days
+    `doctors` are (pk, is_24_7_available, is_emergency_available) rows,
+    `schedules` active emergency (doctor_id, day_of_week, start, end) rows
+    and `leaves` the leaves (LeaveSpan) overlapping the period. Ends are
+    inclusive.
+    """
+    weeks = defaultdict(lambda: [[] for _ in range(7)])
+    for doctor_id, day_of_week, start_time, end_time in schedules:
+        weeks[doctor_id][day_of_week].append((start_time, end_time))
+
+    # (doctor_id, day) -> the covering leave with the latest start, like leaves.first()
+    covering = {}
+    for leave in sorted(leaves, key=lambda leave: (leave.start_date, leave.pk), reverse=True):
+        day = max(leave.start_date, start_day)
+        while day <= leave.end_date and day < start_day + timedelta(days=days):
+            covering.setdefault((leave.doctor_id, day), leave)
+            day += timedelta(days=1)
+
+    intervals = []
+    for offset in range(days):
+        day = start_day + timedelta(days=offset)
+        for doctor_id, is_24_7, is_emergency in doctors:
+            leave = covering.get((doctor_id, day))
+            if leave is not None and not leave.is_emergency_available:
+                continue
+            if is_24_7:
+                intervals.append((doctor_id, datetime.combine(day, time.min), datetime.combine(day, time.max)))
+            elif is_emergency and doctor_id in weeks:
+                for start_time, end_time in sorted(weeks[doctor_id][day.weekday()]):
+                    intervals.append((doctor_id, datetime.combine(day, start_time), datetime.combine(day, end_time)))
+    return intervals
+
+
+def rebuild_timeline(doctor_ids=None, start_day=None):
+    """Replace the materialized intervals of `doctor_ids` (all doctors when None); returns the row count"""
+    from .leaves import leave_index
+    from .models import AvailabilityInterval, Doctor, EmergencySchedule
+
+    start_day = start_day or datetime.now().date()
+    end_day = start_day + timedelta(days=TIMELINE_DAYS - 1)
+
+    doctors = Doctor.objects.filter(Q(is_24_7_available=True) | Q(is_emergency_available=True))
+    schedules = EmergencySchedule.objects.filter(is_active=True, is_emergency=True)
+    existing = AvailabilityInterval.objects.all()
+    if doctor_ids is not None:
+        doctors = doctors.filter(pk__in=doctor_ids)
+        schedules = schedules.filter(doctor_id__in=doctor_ids)
+        existing = existing.filter(doctor_id__in=doctor_ids)
+
+    intervals = build_intervals(
+        doctors.values_list('pk', 'is_24_7_available', 'is_emergency_available'),
+        schedules.values_list('doctor_id', 'day_of_week', 'start_time', 'end_time'),
+        [leave for leaves in leave_index.leaves_between(start_day, end_day, doctor_ids).values() for leave in leaves],
+        start_day,
+    )
+    with transaction.atomic():
+        existing.delete()
+        AvailabilityInterval.objects.bulk_create(
+            [
+                AvailabilityInterval(doctor_id=doctor_id, starts_at=to_aware(starts_at), ends_at=to_aware(ends_at))
+                for doctor_id, starts_at, ends_at in intervals
+            ],
+            batch_size=500,
+        )
+    return len(intervals)
+
+
+def mark_timeline_covered(last_day):
+    """Record that the timeline is built up to `last_day` (inclusive)"""
+    cache.set(TIMELINE_COVERED_CACHE_KEY, last_day.isoformat(), TIMELINE_DAYS * 24 * 60 * 60)
+
+
+def ensure_timeline(now=None):
+    """
+    Request path fallback: full rebuild when no build covers today
+    Normally the refresh_availability_timeline cron command keeps it covered.
+    """
+    today = (now or datetime.now()).date()
+    covered = cache.get(TIMELINE_COVERED_CACHE_KEY)
+    if covered is not None and covered >= today.isoformat():
+        return
+    # One worker builds, the others use the rows there are meanwhile
+    if not cache.add(TIMELINE_LOCK_CACHE_KEY, today.isoformat(), 60):
+        return
+    try:
+        logger.warning('Availability timeline does not cover %s - is refresh_availability_timeline scheduled?', today)
+        rebuild_timeline(start_day=today)
+        mark_timeline_covered(today + timedelta(days=TIMELINE_DAYS - 1))
+    finally:
+        cache.delete(TIMELINE_LOCK_CACHE_KEY)
+
+
+class AvailabilityIndex:
+    """
+    Per-doctor sorted (starts_at, ends_at) list of the upcoming materialized
+    intervals, as local naive datetimes
+    """
+
+    def __init__(self, intervals, now):
+        self.now = now
+        self._intervals = defaultdict(list)
+        for doctor_id, starts_at, ends_at in intervals:
+            self._intervals[doctor_id].append((starts_at, ends_at))
+        for doctor_intervals in self._intervals.values():
+            doctor_intervals.sort()
+
+    @classmethod
+    def load(cls, doctor_ids=None, now=None):
+        """Index for `doctor_ids` (all doctors when None) - one range query"""
+        from .models import AvailabilityInterval
+
+        now = now or datetime.now()
+        ensure_timeline(now)
+        intervals = AvailabilityInterval.objects.filter(ends_at__gte=to_aware(now))
+        if doctor_ids is not None:
+            intervals = intervals.filter(doctor_id__in=doctor_ids)
+        return cls(
+            (
+                (doctor_id, to_local(starts_at), to_local(ends_at))
+                for doctor_id, starts_at, ends_at in intervals.values_list('doctor_id', 'starts_at', 'ends_at')
+            ),
+            now,
+        )
+
+    def is_available_now(self, doctor, now=None):
+        """Whether an on-duty interval of the doctor contains `now`"""
+        now = now or datetime.now()
+        intervals = self._intervals.get(doctor.pk, [])
+        # Only intervals starting at or before now can contain it
+        return any(end >= now for _, end in intervals[:bisect_right(intervals, (now, datetime.max))])
+
+    def next_available_time(self, doctor, now=None):
+        """Text for the start of the next on-duty interval: today's, else its weekday's"""
+        if doctor.is_24_7_available:
+            return "এখনই উপলব্ধ (২৪/৭)"
+
+        now = now or datetime.now()
+        intervals = self._intervals.get(doctor.pk, [])
+        position = bisect_right(intervals, (now, datetime.max))
+        if position == len(intervals):
+            return "সময়সূচী নেই"
+
+        starts_at = intervals[position][0]
+        if starts_at.date() == now.date():
+            return f"আজ {starts_at.strftime('%H:%M')} এ"
+        return f"{DAY_NAMES[starts_at.weekday()]} {starts_at.strftime('%H:%M')} এ"
+
+
+def attach_availability(doctors, now=None):
+    """Give a page of doctors one shared index, so their availability methods run no queries"""
+    doctors = list(doctors)
+    if doctors:
+        index = AvailabilityIndex.load([doctor.pk for doctor in doctors], now)
+        for doctor in doctors:
+            doctor._availability_index = index
+    return doctors
@@ -0,0 +1,80 @@
+# -*- coding: utf-8 -*-
+"""
+Rendered doctor card / table row fragments
+
+The same doctor markup is rendered on many pages, so each fragment is
+cached under (pk, updated_at, language, variant) and a listing fetches all
+fragments of its page with one cache.get_many(). Cards showing the
+"available now" badge are also keyed by the current availability window;
+category, schedule and leave changes (which don't touch the doctor row)
+bump a generation instead.
+"""
+from django.core.cache import cache
+from django.template.loader import render_to_string
+from django.utils.safestring import mark_safe
+from django.utils.translation import get_language
+
+from .availability import attach_availability
+from .versioning import bump_cache_generation, cache_generation
+
+
+FRAGMENT_GENERATION_CACHE_KEY = 'doctors:fragment_generation'
+FRAGMENT_CACHE_TIMEOUT = 6 * 60 * 60
+
+# Bump when the markup of the fragment templates changes
+FRAGMENT_MARKUP_VERSION = 2
+
+# variant -> (template, shows available-now badge, extra fields in the key)
+FRAGMENT_VARIANTS = {
+    'card': ('doctors/fragments/card.html', True, ()),
+    'category_card': ('doctors/fragments/category_card.html', False, ()),
+    'hospital_card': ('doctors/fragments/hospital_card.html', False, ()),
+    'emergency_card': ('doctors/fragments/emergency_card.html', True, ('view_count',)),
+    'table_row': ('doctors/fragments/table_row.html', False, ()),
+}
+
+
+def fragment_generation():
+    return cache_generation(FRAGMENT_GENERATION_CACHE_KEY)
+
+
+def bump_fragment_generation():
+    """Invalidate every cached fragment"""
+    bump_cache_generation(FRAGMENT_GENERATION_CACHE_KEY)
+
+
+def fragment_key(doctor, variant, prefix):
+    """Cache key of one doctor's fragment; `prefix` carries the generation, variant and language"""
+    extra = ''.join(f':{getattr(doctor, field)}' for field in FRAGMENT_VARIANTS[variant][2])
+    updated = doctor.updated_at.timestamp() if doctor.updated_at else 0
+    return f'{prefix}:{doctor.pk}:{updated}{extra}'
+
+
+def render_doctor_fragments(doctors, variant):
+    """Rendered `variant` markup of each doctor, in order, from the cache where possible"""
+    from .page_cache import current_availability_window
+    from .versioning import data_version
+
+    template_name, time_dependent, _ = FRAGMENT_VARIANTS[variant]
+    prefix = f'doctors:fragment:v{FRAGMENT_MARKUP_VERSION}:{fragment_generation()}:{variant}:{get_language()}'
+    if time_dependent:
+        prefix += ':' + current_availability_window(data_version())[0].strftime('%Y%m%d%H%M%S')
+
+    doctors = list(doctors)
+    keys = [fragment_key(doctor, variant, prefix) for doctor in doctors]
+    cached = cache.get_many(keys)
+
+    if time_dependent:
+        # One availability lookup for every card that has to be rendered
+        attach_availability([doctor for doctor, key in zip(doctors, keys) if key not in cached])
+
+    missing = {}
+    fragments = []
+    for doctor, key in zip(doctors, keys):
+        html = cached.get(key)
+        if html is None:
+            html = missing[key] = render_to_string(template_name, {'doctor': doctor})
+        fragments.append(mark_safe(html))
+    if missing:
+        cache.set_many(missing, FRAGMENT_CACHE_TIMEOUT)
+    return fragments
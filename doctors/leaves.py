@@ -0,0 +1,156 @@
+# -*- coding: utf-8 -*-
+"""
+In-process interval tree index of doctor leaves
+
+Every DoctorLeave is kept as a (start_date, end_date) interval in an
+augmented interval tree, one over all leaves and one per doctor, so
+"which of these doctors are on leave on day D" and "who is away between
+D1 and D2" are answered for a whole page or planning screen without a
+query per row. Signals bump a version in the shared cache on every leave
+change, so other worker processes rebuild their copy.
+"""
+import threading
+import time
+import uuid
+from collections import defaultdict, namedtuple
+
+from django.core.cache import cache
+
+
+LEAVE_INDEX_VERSION_CACHE_KEY = 'doctors:leave_index_version'
+
+# Rebuild at least this often (seconds), in case leaves were changed
+# without signals (queryset.update(), raw SQL)
+LEAVE_INDEX_MAX_AGE = 15 * 60
+
+LeaveSpan = namedtuple('LeaveSpan', ['pk', 'doctor_id', 'start_date', 'end_date', 'is_emergency_available'])
+
+
+class IntervalTree:
+    """
+    Static augmented interval tree over (start, end, value) items
+
+    Items are sorted by start; the implicit balanced tree over that array
+    (the middle item of every range is its root) keeps the largest end of
+    each subtree, so whole subtrees ending before a query are skipped.
+    Bounds are inclusive.
+    """
+
+    def __init__(self, items):
+        self._items = sorted(items, key=lambda item: (item[0], item[1]))
+        self._max_end = [None] * len(self._items)
+        if self._items:
+            self._build(0, len(self._items))
+
+    def __len__(self):
+        return len(self._items)
+
+    def _build(self, lo, hi):
+        mid = (lo + hi) // 2
+        max_end = self._items[mid][1]
+        if lo < mid:
+            max_end = max(max_end, self._build(lo, mid))
+        if mid + 1 < hi:
+            max_end = max(max_end, self._build(mid + 1, hi))
+        self._max_end[mid] = max_end
+        return max_end
+
+    def overlapping(self, start, end):
+        """Values of the items overlapping [start, end], in start order"""
+        found = []
+        stack = [(0, len(self._items))]
+        while stack:
+            lo, hi = stack.pop()
+            if lo >= hi:
+                continue
+            mid = (lo + hi) // 2
+            if self._max_end[mid] < start:
+                continue  # everything below ends too early
+            item_start, item_end, value = self._items[mid]
+            stack.append((lo, mid))
+            if item_start <= end:
+                if item_end >= start:
+                    found.append((item_start, item_end, mid, value))
+                # Items on the right start even later
+                stack.append((mid + 1, hi))
+        found.sort()
+        return [value for *_, value in found]
+
+    def at(self, point):
+        """Values of the items containing `point`"""
+        return self.overlapping(point, point)
+
+
+class DoctorLeaveIndex:
+    """Interval trees of all leaves and of every doctor's leaves"""
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._all = IntervalTree([])
+        self._by_doctor = {}
+        self._version = None
+        self._built_at = 0
+
+    def build(self):
+        """(Re)build the trees from the database - one query"""
+        from .models import DoctorLeave
+
+        leaves = DoctorLeave.objects.values_list(
+            'pk', 'doctor_id', 'start_date', 'end_date', 'is_emergency_available'
+        )
+        with self._lock:
+            cache.add(LEAVE_INDEX_VERSION_CACHE_KEY, uuid.uuid4().hex, None)
+            version = cache.get(LEAVE_INDEX_VERSION_CACHE_KEY)
+            items = [(leave.start_date, leave.end_date, leave) for leave in map(LeaveSpan._make, leaves)]
+            by_doctor = defaultdict(list)
+            for item in items:
+                by_doctor[item[2].doctor_id].append(item)
+            self._all = IntervalTree(items)
+            self._by_doctor = {doctor_id: IntervalTree(doctor_items) for doctor_id, doctor_items in by_doctor.items()}
+            self._version = version
+            self._built_at = time.monotonic()
+
+    def _ensure_fresh(self):
+        """Build the index on first use and rebuild it when it went stale"""
+        with self._lock:
+            stale = (
+                not self._built_at
+                or time.monotonic() - self._built_at > LEAVE_INDEX_MAX_AGE
+                or cache.get(LEAVE_INDEX_VERSION_CACHE_KEY) != self._version
+            )
+            if stale:
+                self.build()
+
+    def _trees(self, doctor_ids):
+        if doctor_ids is None:
+            return [self._all]
+        return [self._by_doctor[doctor_id] for doctor_id in set(doctor_ids) if doctor_id in self._by_doctor]
+
+    def leaves_between(self, start, end, doctor_ids=None):
+        """{doctor_id: [LeaveSpan, ...]} of the leaves overlapping [start, end] (all doctors when None)"""
+        self._ensure_fresh()
+        with self._lock:
+            trees = self._trees(doctor_ids)
+        away = defaultdict(list)
+        for tree in trees:
+            for leave in tree.overlapping(start, end):
+                away[leave.doctor_id].append(leave)
+        return dict(away)
+
+    def leaves_on(self, day, doctor_ids=None):
+        """
+        {doctor_id: LeaveSpan} of the leave covering `day` for each doctor on
+        leave - the one starting last, like doctor.leaves.first()
+        """
+        return {
+            doctor_id: max(leaves, key=lambda leave: (leave.start_date, leave.pk))
+            for doctor_id, leaves in self.leaves_between(day, day, doctor_ids).items()
+        }
+
+
+def bump_leave_index_version():
+    """Make every worker rebuild its leave index"""
+    cache.set(LEAVE_INDEX_VERSION_CACHE_KEY, uuid.uuid4().hex, None)
+
+
+leave_index = DoctorLeaveIndex()
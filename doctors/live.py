@@ -0,0 +1,262 @@
+# -*- coding: utf-8 -*-
+"""
+Live emergency duty board (Server-Sent Events)
+
+A raw ASGI endpoint mounted in config/asgi.py, next to Django. One
+broadcaster task per process computes the set of doctors on duty right
+now, sleeps until the next availability boundary (or until the data
+version changes) and pushes only the doctors coming on or going off duty
+to every connected screen. An idle viewer is a parked coroutine and a
+queue, plus a keep-alive comment now and then - no requests, no queries.
+Requests bypass Django's middleware, so the Host header is checked
+against ALLOWED_HOSTS here.
+"""
+import asyncio
+import io
+import json
+import logging
+from datetime import datetime
+
+from asgiref.sync import sync_to_async
+from django.core.exceptions import DisallowedHost
+from django.core.handlers.asgi import ASGIRequest
+from django.db import close_old_connections
+from django.db.models import Q
+
+
+DUTY_BOARD_PATH = '/emergency/live/'
+
+# Seconds between data version checks (one cache read) - admin edits
+# show up this late at most
+DATA_CHECK_INTERVAL = 15
+
+# Keep-alive comment so proxies don't close idle connections
+KEEPALIVE_INTERVAL = 25
+
+# Browsers reconnect after this many milliseconds when the stream drops
+RETRY_MS = 5000
+
+# A screen that falls this many events behind is disconnected; it
+# reconnects and starts again from a fresh snapshot
+QUEUE_SIZE = 16
+
+# Seconds a new screen waits for the first state before getting a 503
+READY_TIMEOUT = 10
+
+logger = logging.getLogger(__name__)
+
+
+def duty_board_state():
+    """(ids of the emergency doctors available now, data version token, end of the availability window)"""
+    from .models import Doctor
+    from .page_cache import current_availability_window
+    from .versioning import data_version
+
+    close_old_connections()
+    try:
+        version = data_version()
+        window_end = current_availability_window(version)[1]
+        available = set(
+            Doctor.objects.filter(is_active=True)
+            .filter(Q(is_emergency_available=True) | Q(is_24_7_available=True))
+            .with_available_now()
+            .filter(available_now=True)
+            .values_list('pk', flat=True)
+        )
+        return available, version.token, window_end
+    finally:
+        close_old_connections()
+
+
+def current_version_token():
+    from .versioning import data_version
+
+    return data_version().token
+
+
+def sse_event(event, data, event_id=None):
+    lines = []
+    if event_id is not None:
+        lines.append(f'id: {event_id}')
+    lines.append(f'event: {event}')
+    lines.append(f'data: {json.dumps(data, separators=(",", ":"))}')
+    return ('\n'.join(lines) + '\n\n').encode('utf-8')
+
+
+class DutyBoardBroadcaster:
+    """Shares one availability watcher between all connected screens of the process"""
+
+    def __init__(self):
+        self.available = None
+        self.sequence = 0
+        self._subscribers = set()
+        self._task = None
+        self._ready = None
+
+    async def subscribe(self):
+        """
+        Queue receiving the diffs; the current state is in self.available once
+        this returns. None when the state couldn't be loaded in READY_TIMEOUT.
+        """
+        queue = asyncio.Queue(QUEUE_SIZE)
+        self._subscribers.add(queue)
+        if self._task is None or self._task.done():
+            self._ready = asyncio.Event()
+            self._task = asyncio.get_running_loop().create_task(self._run())
+        try:
+            await asyncio.wait_for(self._ready.wait(), READY_TIMEOUT)
+        except asyncio.TimeoutError:
+            self.unsubscribe(queue)
+            return None
+        except asyncio.CancelledError:
+            self.unsubscribe(queue)  # client gone while waiting
+            raise
+        return queue
+
+    def unsubscribe(self, queue):
+        self._subscribers.discard(queue)
+        if not self._subscribers and self._task is not None:
+            # Nobody is watching - stop querying until the next screen connects
+            self._task.cancel()
+            self._task = None
+            self.available = None
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+        for queue in list(self._subscribers):
+            self._drop(queue)
+
+    def _drop(self, queue):
+        self._subscribers.discard(queue)
+        while not queue.empty():
+            queue.get_nowait()
+        queue.put_nowait(None)  # tells the stream to close
+
+    def _publish(self, on, off):
+        self.sequence += 1
+        message = (self.sequence, {'on': sorted(on), 'off': sorted(off), 'at': datetime.now().isoformat(timespec='seconds')})
+        for queue in list(self._subscribers):
+            try:
+                queue.put_nowait(message)
+            except asyncio.QueueFull:
+                self._drop(queue)
+
+    async def _run(self):
+        while True:
+            try:
+                available, token, window_end = await sync_to_async(duty_board_state)()
+            except Exception:
+                logger.exception('Failed to load the duty board state')
+                await asyncio.sleep(DATA_CHECK_INTERVAL)
+                continue
+            if self.available is not None:
+                on, off = available - self.available, self.available - available
+                if on or off:
+                    self._publish(on, off)
+            self.available = available
+            self._ready.set()
+
+            # Sleep until the next schedule boundary, waking up now and
+            # then to notice admin edits
+            while True:
+                remaining = (window_end - datetime.now()).total_seconds()
+                if remaining <= 0:
+                    break
+                await asyncio.sleep(min(remaining, DATA_CHECK_INTERVAL))
+                try:
+                    if await sync_to_async(current_version_token)() != token:
+                        break
+                except Exception:
+                    logger.exception('Failed to read the data version')
+
+
+broadcaster = DutyBoardBroadcaster()
+
+
+def host_allowed(scope):
+    """The Host (or X-Forwarded-Host) check Django's request.get_host() does"""
+    try:
+        ASGIRequest(scope, io.BytesIO()).get_host()
+    except DisallowedHost as error:
+        logging.getLogger('django.security.DisallowedHost').warning(str(error))
+        return False
+    return True
+
+
+async def _plain_response(send, status, headers=()):
+    await send({'type': 'http.response.start', 'status': status, 'headers': list(headers)})
+    await send({'type': 'http.response.body', 'body': b''})
+
+
+async def duty_board_stream(scope, receive, send):
+    """ASGI app: `snapshot` of the doctors available now, then `diff` events {on, off, at}"""
+    if not host_allowed(scope):
+        await _plain_response(send, 400)
+        return
+    if scope['method'] not in ('GET', 'HEAD'):
+        await _plain_response(send, 405, [(b'allow', b'GET, HEAD')])
+        return
+
+    queue = None
+    if scope['method'] == 'GET':
+        queue = await broadcaster.subscribe()
+        if queue is None:
+            # duty_board.js opens a new stream after a while
+            await _plain_response(send, 503, [(b'retry-after', str(RETRY_MS // 1000).encode('ascii'))])
+            return
+
+    try:
+        await send({
+            'type': 'http.response.start',
+            'status': 200,
+            'headers': [
+                (b'content-type', b'text/event-stream; charset=utf-8'),
+                (b'cache-control', b'no-cache'),
+                # nginx would buffer the stream otherwise
+                (b'x-accel-buffering', b'no'),
+            ],
+        })
+        if queue is None:  # HEAD
+            await send({'type': 'http.response.body', 'body': b''})
+            return
+
+        await send({
+            'type': 'http.response.body',
+            'body': f'retry: {RETRY_MS}\n\n'.encode('ascii') + sse_event(
+                'snapshot', {'available': sorted(broadcaster.available)}, broadcaster.sequence
+            ),
+            'more_body': True,
+        })
+        disconnected = asyncio.ensure_future(_wait_for_disconnect(receive))
+        try:
+            while True:
+                message = asyncio.ensure_future(queue.get())
+                done, _ = await asyncio.wait({message, disconnected}, timeout=KEEPALIVE_INTERVAL, return_when=asyncio.FIRST_COMPLETED)
+                if disconnected in done:
+                    message.cancel()
+                    return
+                if message not in done:
+                    message.cancel()
+                    body = b': keep-alive\n\n'
+                else:
+                    item = message.result()
+                    if item is None:
+                        break
+                    sequence, diff = item
+                    body = sse_event('diff', diff, sequence)
+                await send({'type': 'http.response.body', 'body': body, 'more_body': True})
+        finally:
+            disconnected.cancel()
+        await send({'type': 'http.response.body', 'body': b''})
+    except OSError:
+        pass  # client went away mid-write
+    finally:
+        if queue is not None:
+            broadcaster.unsubscribe(queue)
+
+
+async def _wait_for_disconnect(receive):
+    while (await receive())['type'] != 'http.disconnect':
+        pass
@@ -0,0 +1,83 @@
+# -*- coding: utf-8 -*-
+from datetime import date, timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Min
+from django.utils import timezone
+
+from doctors.analytics import aggregate_daily_stats, raw_days, rebuild_search_sketches
+from doctors.models import DailyStats, DoctorView, SearchQuery
+
+
+class Command(BaseCommand):
+    help = 'Aggregate DoctorView and SearchQuery rows into DailyStats (only days not yet aggregated)'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--from',
+            dest='date_from',
+            help='First day to (re)aggregate, YYYY-MM-DD',
+        )
+        parser.add_argument(
+            '--to',
+            dest='date_to',
+            help='Last day to (re)aggregate, YYYY-MM-DD (default: today)',
+        )
+        parser.add_argument(
+            '--rebuild-search-sketches',
+            action='store_true',
+            help='Recompute the daily search term sketches from stored searches first (repair tool - migration 0019 backfills the history)',
+        )
+
+    def handle(self, *args, **options):
+        date_to = self.parse_date(options['date_to']) if options['date_to'] else timezone.localdate()
+        date_from = self.parse_date(options['date_from']) if options['date_from'] else self.first_pending_day()
+
+        if date_from is None:
+            self.stdout.write(self.style.WARNING('⚠️ No views or searches recorded yet'))
+            return
+        if date_from > date_to:
+            raise CommandError('--from must not be after --to')
+
+        # Compacted days (and days with stats but no raw events left) keep their stats
+        stats_days = DailyStats.objects.filter(date__gte=date_from, date__lte=date_to)
+        compacted = set(stats_days.values_list('date', flat=True))
+        compacted.difference_update(raw_days(date_from, date_to + timedelta(days=1)))
+        compacted.update(stats_days.filter(is_compacted=True).values_list('date', flat=True))
+
+        day = date_from
+        while day <= date_to:
+            if day in compacted:
+                self.stdout.write(f'  {day}: compacted, skipped')
+            else:
+                if options['rebuild_search_sketches']:
+                    rebuild_search_sketches(day)
+                stats = aggregate_daily_stats(day)
+                self.stdout.write(f'  {day}: {stats.total_views} views, {stats.total_searches} searches')
+            day += timedelta(days=1)
+
+        self.stdout.write(self.style.SUCCESS(f'✅ Daily stats aggregated for {date_from} - {date_to}'))
+
+    def parse_date(self, value):
+        try:
+            return date.fromisoformat(value)
+        except ValueError:
+            raise CommandError(f'Invalid date "{value}", expected YYYY-MM-DD')
+
+    def first_pending_day(self):
+        """
+        The last aggregated day (it may have been aggregated while still
+        in progress), or the first day with data when nothing is aggregated yet
+        """
+        last = DailyStats.objects.order_by('-date').values_list('date', flat=True).first()
+        if last:
+            return last
+
+        first_times = [
+            DoctorView.objects.aggregate(first=Min('viewed_at'))['first'],
+            SearchQuery.objects.aggregate(first=Min('searched_at'))['first'],
+        ]
+        first_times = [value for value in first_times if value]
+        if not first_times:
+            return None
+        return timezone.localtime(min(first_times)).date()
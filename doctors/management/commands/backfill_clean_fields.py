@@ -0,0 +1,40 @@
+# -*- coding: utf-8 -*-
+from django.core.management.base import BaseCommand
+from doctors.models import Doctor
+
+
+class Command(BaseCommand):
+    help = 'Recompute the cleaned display fields (clean_specialty, clean_hospital, ...) of all doctors - migration 0011 fills them on deploy, this repairs rows changed without save()'
+    
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=500,
+            help='Number of doctors updated per query',
+        )
+    
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        clean_fields = list(Doctor.CLEAN_FIELDS)
+        source_fields = [source for source, _ in Doctor.CLEAN_FIELDS.values()]
+        
+        doctors = Doctor.objects.only('pk', *source_fields, *clean_fields).order_by('pk')
+        
+        batch = []
+        updated_count = 0
+        for doctor in doctors.iterator(chunk_size=batch_size):
+            before = [getattr(doctor, field) for field in clean_fields]
+            doctor.update_clean_fields()
+            if [getattr(doctor, field) for field in clean_fields] != before:
+                batch.append(doctor)
+            if len(batch) >= batch_size:
+                Doctor.objects.bulk_update(batch, clean_fields)
+                updated_count += len(batch)
+                batch = []
+        
+        if batch:
+            Doctor.objects.bulk_update(batch, clean_fields)
+            updated_count += len(batch)
+        
+        self.stdout.write(self.style.SUCCESS(f'✅ Cleaned display fields updated for {updated_count} doctors'))
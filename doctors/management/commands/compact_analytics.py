@@ -0,0 +1,40 @@
+# -*- coding: utf-8 -*-
+from django.core.management.base import BaseCommand
+
+from doctors.analytics import PURGE_BATCH_SIZE, RETENTION_DAYS, compact_day, raw_days, retention_cutoff
+
+
+class Command(BaseCommand):
+    help = 'Roll raw DoctorView/SearchQuery rows older than the retention window into daily aggregates and delete them'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--days',
+            type=int,
+            default=RETENTION_DAYS,
+            help=f'Keep raw events of the last N days (default: {RETENTION_DAYS})',
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=PURGE_BATCH_SIZE,
+            help='Number of rows deleted per query',
+        )
+
+    def handle(self, *args, **options):
+        cutoff = retention_cutoff(options['days'])
+        days = raw_days(date_to=cutoff)
+        if not days:
+            self.stdout.write(self.style.SUCCESS(f'✅ No raw events before {cutoff}'))
+            return
+
+        total_views = total_searches = 0
+        for day in days:
+            views, searches = compact_day(day, options['batch_size'])
+            total_views += views
+            total_searches += searches
+            self.stdout.write(f'  {day}: {views} views, {searches} searches compacted')
+
+        self.stdout.write(self.style.SUCCESS(
+            f'✅ {len(days)} days compacted, {total_views} views and {total_searches} searches deleted'
+        ))
@@ -0,0 +1,35 @@
+# -*- coding: utf-8 -*-
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.db.models import Min
+from django.utils import timezone
+
+from doctors.analytics import rebuild_hourly_views
+from doctors.models import DoctorView
+from doctors.tracking import truncate_to_hour
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the hourly view rollup (DoctorViewHourly) from raw DoctorView rows'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--days',
+            type=int,
+            default=None,
+            help='Only rebuild the last N days (default: all raw history)',
+        )
+
+    def handle(self, *args, **options):
+        # Buckets older than the oldest raw view are all that is left of purged history
+        start_hour = self.oldest_raw_view()
+        if options['days']:
+            start_hour = max(start_hour, truncate_to_hour(timezone.now() - timedelta(days=options['days'])))
+
+        created = rebuild_hourly_views(start=start_hour)
+        self.stdout.write(self.style.SUCCESS(f'✅ Hourly view rollup rebuilt: {created} buckets'))
+
+    def oldest_raw_view(self):
+        oldest = DoctorView.objects.aggregate(oldest=Min('viewed_at'))['oldest']
+        return truncate_to_hour(oldest) if oldest else timezone.now()
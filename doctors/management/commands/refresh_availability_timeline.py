@@ -0,0 +1,16 @@
+# -*- coding: utf-8 -*-
+from datetime import datetime, timedelta
+
+from django.core.management.base import BaseCommand
+
+from doctors.availability import TIMELINE_DAYS, mark_timeline_covered, rebuild_timeline
+
+
+class Command(BaseCommand):
+    help = f'Rebuild the materialized on-duty intervals of every doctor for the next {TIMELINE_DAYS} days (run daily after midnight)'
+
+    def handle(self, *args, **options):
+        today = datetime.now().date()
+        count = rebuild_timeline(start_day=today)
+        mark_timeline_covered(today + timedelta(days=TIMELINE_DAYS - 1))
+        self.stdout.write(self.style.SUCCESS(f'✅ {count} availability intervals built from {today}'))
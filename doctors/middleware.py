@@ -0,0 +1,91 @@
+# -*- coding: utf-8 -*-
+"""
+Conditional GET for the public directory pages
+
+Anonymous pages get a strong ETag and Last-Modified derived from the data
+version, so a repeat visit is answered with 304 Not Modified before the
+view (or any template) runs. Like the page cache, requests the view must
+see (searches, which are logged) always reach it, and a 304 runs the
+view's page cache hit hook (profile view tracking).
+"""
+import hashlib
+
+from django.contrib.messages import get_messages
+from django.utils.cache import get_conditional_response, patch_cache_control, patch_vary_headers
+from django.utils.http import http_date, quote_etag
+
+from .page_cache import current_availability_window
+from .utils import is_ajax
+from .versioning import data_version
+
+
+# URL names of the pages that get validators
+CONDITIONAL_VIEWS = {
+    'doctors:index',
+    'doctors:table',
+    'doctors:category',
+    'doctors:detail',
+    'doctors:hospital_list',
+    'doctors:hospital_doctors',
+    'doctors:emergency',
+}
+
+
+def directory_validators(request):
+    """(strong ETag, Last-Modified timestamp) of an anonymous directory page"""
+    version = data_version()
+    window_start = current_availability_window(version)[0]
+    raw = '|'.join([
+        version.token,
+        window_start.isoformat(),
+        request.get_full_path(),
+        'ajax' if is_ajax(request) else 'page',
+        # The page embeds a token for this CSRF secret (language form); a
+        # first visit gets its cookie with the response
+        request.META.get('CSRF_COOKIE', ''),
+    ])
+    etag = quote_etag(hashlib.md5(raw.encode('utf-8')).hexdigest())
+    last_modified = max(int(version.last_modified.timestamp()), int(window_start.timestamp()))
+    return etag, last_modified
+
+
+class ConditionalDirectoryMiddleware:
+    """ETag/Last-Modified + 304 for anonymous GETs of CONDITIONAL_VIEWS"""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        response = self.get_response(request)
+        if not getattr(request, '_directory_conditional', False) or response.status_code not in (200, 304):
+            return response
+        if getattr(get_messages(request), 'used', False):
+            return response  # flashed messages are shown once
+        # Again - rendering may have created the CSRF secret
+        etag, last_modified = directory_validators(request)
+        if not response.has_header('ETag'):
+            response['ETag'] = etag
+        if not response.has_header('Last-Modified'):
+            response['Last-Modified'] = http_date(last_modified)
+        # Always revalidate - a 304 is cheap and badges change over time
+        patch_cache_control(response, private=True, no_cache=True)
+        patch_vary_headers(response, ['Cookie'])
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        if request.method not in ('GET', 'HEAD'):
+            return None
+        if request.resolver_match is None or request.resolver_match.view_name not in CONDITIONAL_VIEWS:
+            return None
+        # Logged-in pages show favorites, reviews and appointments of the user
+        if request.user.is_authenticated or len(get_messages(request)):
+            return None
+        if any(request.GET.get(param) for param in getattr(view_func, 'page_cache_uncached_params', ())):
+            return None
+        request._directory_conditional = True
+        etag, last_modified = directory_validators(request)
+        response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+        on_hit = getattr(view_func, 'page_cache_on_hit', None)
+        if response is not None and response.status_code == 304 and on_hit is not None:
+            on_hit(request, *view_args, **view_kwargs)
+        return response
@@ -0,0 +1,86 @@
+# Generated by Django 4.2 on 2026-10-18 16:27
+
+import re
+
+from django.db import migrations, models
+from django.utils.html import strip_tags
+
+
+# Frozen copies of Doctor.clean_text / Doctor.clean_contact_text
+def clean_text(text):
+    if not text:
+        return ''
+    text = re.sub(r'<br\s*/?>', ' ', text, flags=re.IGNORECASE)
+    text = strip_tags(text)
+    text = re.sub(r'\s+', ' ', text)
+    return text.strip()
+
+
+def clean_contact_text(text):
+    if not text:
+        return ''
+    text = re.sub(r'<br\s*/?>', ', ', text, flags=re.IGNORECASE)
+    text = strip_tags(text)
+    text = re.sub(r'\s+', ' ', text)
+    return text.strip()
+
+
+CLEAN_FIELDS = {
+    'clean_specialty': ('specialty', clean_text),
+    'clean_specialty_en': ('specialty_en', clean_text),
+    'clean_hospital': ('hospital', clean_text),
+    'clean_hospital_en': ('hospital_en', clean_text),
+    'clean_contact': ('contact', clean_contact_text),
+}
+
+
+def fill_clean_fields(apps, schema_editor):
+    """Existing doctors get their cleaned display fields right away"""
+    Doctor = apps.get_model('doctors', 'Doctor')
+    sources = [source for source, _ in CLEAN_FIELDS.values()]
+    batch = []
+    for doctor in Doctor.objects.only('pk', *sources).order_by('pk').iterator(chunk_size=500):
+        for clean_field, (source, cleaner) in CLEAN_FIELDS.items():
+            setattr(doctor, clean_field, cleaner(getattr(doctor, source)))
+        batch.append(doctor)
+        if len(batch) >= 500:
+            Doctor.objects.bulk_update(batch, list(CLEAN_FIELDS))
+            batch = []
+    if batch:
+        Doctor.objects.bulk_update(batch, list(CLEAN_FIELDS))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('doctors', '0010_category_description_en_doctor_emergency_note_en_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='doctor',
+            name='clean_contact',
+            field=models.CharField(blank=True, editable=False, max_length=200, verbose_name='যোগাযোগ (পরিষ্কার)'),
+        ),
+        migrations.AddField(
+            model_name='doctor',
+            name='clean_hospital',
+            field=models.CharField(blank=True, editable=False, max_length=200, verbose_name='হাসপাতাল (পরিষ্কার)'),
+        ),
+        migrations.AddField(
+            model_name='doctor',
+            name='clean_hospital_en',
+            field=models.CharField(blank=True, editable=False, max_length=200, verbose_name='Hospital (English, clean)'),
+        ),
+        migrations.AddField(
+            model_name='doctor',
+            name='clean_specialty',
+            field=models.CharField(blank=True, editable=False, max_length=200, verbose_name='বিশেষত্ব (পরিষ্কার)'),
+        ),
+        migrations.AddField(
+            model_name='doctor',
+            name='clean_specialty_en',
+            field=models.CharField(blank=True, editable=False, max_length=200, verbose_name='Specialty (English, clean)'),
+        ),
+        migrations.RunPython(fill_clean_fields, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 4.2 on 2026-10-18 16:29
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('doctors', '0011_doctor_clean_fields'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='doctorview',
+            name='viewed_at',
+            field=models.DateTimeField(default=django.utils.timezone.now, verbose_name='দেখার সময়'),
+        ),
+    ]
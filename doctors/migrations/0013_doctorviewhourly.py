@@ -0,0 +1,36 @@
+# Generated by Django 4.2 on 2026-10-18 16:30
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('doctors', '0012_doctorview_viewed_at_default'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DoctorViewHourly',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('hour', models.DateTimeField(verbose_name='ঘণ্টা')),
+                ('views', models.IntegerField(default=0, verbose_name='ভিউ')),
+                ('doctor', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='hourly_views', to='doctors.doctor', verbose_name='ডাক্তার')),
+            ],
+            options={
+                'verbose_name': 'ঘণ্টাভিত্তিক ভিউ',
+                'verbose_name_plural': 'ঘণ্টাভিত্তিক ভিউসমূহ',
+                'ordering': ['-hour'],
+            },
+        ),
+        migrations.AddIndex(
+            model_name='doctorviewhourly',
+            index=models.Index(fields=['hour', 'doctor'], name='doctors_doc_hour_98c19b_idx'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='doctorviewhourly',
+            unique_together={('doctor', 'hour')},
+        ),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 4.2 on 2026-10-18 16:32
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('doctors', '0013_doctorviewhourly'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SearchQueryDaily',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField(verbose_name='তারিখ')),
+                ('query', models.CharField(max_length=255, verbose_name='সার্চ টার্ম')),
+                ('count', models.IntegerField(default=0, verbose_name='সার্চ সংখ্যা')),
+            ],
+            options={
+                'verbose_name': 'দৈনিক সার্চ টার্ম',
+                'verbose_name_plural': 'দৈনিক সার্চ টার্মসমূহ',
+                'ordering': ['-date', '-count'],
+                'unique_together': {('date', 'query')},
+            },
+        ),
+    ]
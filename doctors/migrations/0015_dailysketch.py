@@ -0,0 +1,37 @@
+# Generated by Django 4.2 on 2026-10-18 16:33
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('doctors', '0014_searchquerydaily'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailySketch',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField(verbose_name='তারিখ')),
+                ('kind', models.CharField(choices=[('visitors', 'ইউনিক ভিজিটর'), ('search_terms', 'ইউনিক সার্চ টার্ম')], max_length=20, verbose_name='ধরন')),
+                ('data', models.BinaryField(verbose_name='স্কেচ')),
+                ('doctor', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='daily_sketches', to='doctors.doctor', verbose_name='ডাক্তার')),
+            ],
+            options={
+                'verbose_name': 'দৈনিক স্কেচ',
+                'verbose_name_plural': 'দৈনিক স্কেচসমূহ',
+                'ordering': ['-date'],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='dailysketch',
+            constraint=models.UniqueConstraint(fields=('date', 'kind', 'doctor'), name='unique_daily_sketch'),
+        ),
+        migrations.AddConstraint(
+            model_name='dailysketch',
+            constraint=models.UniqueConstraint(condition=models.Q(('doctor__isnull', True)), fields=('date', 'kind'), name='unique_site_daily_sketch'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 4.2 on 2026-10-18 16:34
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('doctors', '0015_dailysketch'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='dailysketch',
+            name='kind',
+            field=models.CharField(choices=[('visitors', 'ইউনিক ভিজিটর'), ('search_terms', 'ইউনিক সার্চ টার্ম'), ('top_search_terms', 'জনপ্রিয় সার্চ টার্ম')], max_length=20, verbose_name='ধরন'),
+        ),
+    ]
@@ -0,0 +1,36 @@
+# Generated by Django 4.2 on 2026-10-18 16:50
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('doctors', '0016_dailysketch_top_search_terms'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AvailabilityInterval',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('starts_at', models.DateTimeField(verbose_name='শুরু')),
+                ('ends_at', models.DateTimeField(verbose_name='শেষ')),
+                ('doctor', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='availability_intervals', to='doctors.doctor', verbose_name='ডাক্তার')),
+            ],
+            options={
+                'verbose_name': 'উপলব্ধ সময়',
+                'verbose_name_plural': 'উপলব্ধ সময়সমূহ',
+                'ordering': ['starts_at'],
+            },
+        ),
+        migrations.AddIndex(
+            model_name='availabilityinterval',
+            index=models.Index(fields=['starts_at', 'ends_at'], name='doctors_ava_starts__8f5df9_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='availabilityinterval',
+            index=models.Index(fields=['doctor', 'starts_at'], name='doctors_ava_doctor__01815a_idx'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 4.2 on 2026-10-18 17:06
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('doctors', '0017_availabilityinterval'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='dailystats',
+            name='is_compacted',
+            field=models.BooleanField(default=False, help_text='কাঁচা ভিউ/সার্চ মুছে ফেলা হয়েছে - পরিসংখ্যান আর নতুন করে গণনা হবে না', verbose_name='কম্প্যাক্ট হয়েছে'),
+        ),
+    ]
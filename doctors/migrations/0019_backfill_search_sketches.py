@@ -0,0 +1,60 @@
+# Generated by Django 4.2 on 2026-10-18 17:20
+
+from collections import Counter, defaultdict
+
+from django.db import migrations
+from django.utils import timezone
+
+from doctors.sketches import HyperLogLog, SpaceSaving
+
+
+SEARCH_TERMS = 'search_terms'
+TOP_SEARCH_TERMS = 'top_search_terms'
+
+
+def normalize_search_term(query):
+    # Frozen copy of doctors.analytics.normalize_search_term
+    return ' '.join(query.split()).casefold()
+
+
+def backfill_search_sketches(apps, schema_editor):
+    """
+    Popular searches are read from the daily sketches only - build them for
+    the days recorded before the sketches existed (raw rows and rollups)
+    """
+    SearchQuery = apps.get_model('doctors', 'SearchQuery')
+    SearchQueryDaily = apps.get_model('doctors', 'SearchQueryDaily')
+    DailySketch = apps.get_model('doctors', 'DailySketch')
+
+    counts = defaultdict(Counter)
+    for query, searched_at in SearchQuery.objects.values_list('query', 'searched_at').iterator():
+        counts[timezone.localdate(searched_at)][normalize_search_term(query)] += 1
+    for day, query, count in SearchQueryDaily.objects.values_list('date', 'query', 'count').iterator():
+        counts[day][normalize_search_term(query)] += count
+
+    for day, day_counts in counts.items():
+        day_counts.pop('', None)
+        if not day_counts:
+            continue
+        terms, top = HyperLogLog(), SpaceSaving()
+        for term, count in day_counts.items():
+            terms.add(term)
+            top.add(term, count)
+        DailySketch.objects.filter(
+            date=day, doctor__isnull=True, kind__in=[SEARCH_TERMS, TOP_SEARCH_TERMS]
+        ).delete()
+        DailySketch.objects.bulk_create([
+            DailySketch(date=day, kind=SEARCH_TERMS, data=terms.to_bytes()),
+            DailySketch(date=day, kind=TOP_SEARCH_TERMS, data=top.to_bytes()),
+        ])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('doctors', '0018_dailystats_is_compacted'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_search_sketches, migrations.RunPython.noop),
+    ]
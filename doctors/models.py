@@ -2,6 +2,7 @@
 from django.db import models
 from django.utils.html import strip_tags
 from django.utils.text import slugify
+from django.utils import timezone
 import re
 
 
@@ -73,6 +74,66 @@ class CategoryKeyword(models.Model):
         return f'{self.category.name} - {self.keyword}'
 
 
+class DoctorQuerySet(models.QuerySet):
+    """Doctor queryset with listing helpers"""
+    
+    # Columns every listing needs (card header + keyset pagination ordering
+    # + fragment cache key)
+    LISTING_BASE_FIELDS = ('name', 'image', 'is_emergency_available', 'is_24_7_available', 'updated_at')
+    
+    # Extra columns rendered by each listing template
+    LISTING_FIELDS = {
+        # index.html / category.html cards
+        'card': ('qualification', 'clean_specialty', 'schedule', 'clean_hospital', 'clean_contact', 'primary_category'),
+        # hospital_doctors.html cards (+ address shown in the header)
+        'hospital': ('qualification', 'clean_specialty', 'schedule', 'clean_contact', 'hospital_address'),
+        # table.html rows
+        'table': ('qualification', 'clean_specialty', 'schedule', 'clean_hospital', 'clean_contact'),
+        # emergency.html cards
+        'emergency': ('clean_specialty', 'clean_hospital', 'clean_contact', 'emergency_phone', 'emergency_note', 'view_count'),
+        # Small avatar strips (homepage emergency section)
+        'compact': ('clean_specialty',),
+    }
+    
+    # Fields that have an English (_en) counterpart
+    TRANSLATED_FIELDS = (
+        'name', 'qualification', 'specialty', 'schedule', 'hospital', 'hospital_address', 'emergency_note',
+        'clean_specialty', 'clean_hospital',
+    )
+    
+    def for_listing(self, language=None, variant='card'):
+        """
+        Load only the columns a listing template renders for the language
+        Bengali pages skip every _en column, English pages load both
+        because the translated getters fall back to Bengali
+        """
+        from django.utils.translation import get_language
+        if language is None:
+            language = get_language()
+        
+        fields = list(self.LISTING_BASE_FIELDS) + list(self.LISTING_FIELDS[variant])
+        if language == 'en':
+            fields += [f'{field}_en' for field in fields if field in self.TRANSLATED_FIELDS]
+        return self.only(*fields)
+
+    def with_available_now(self, now=None):
+        """
+        Annotate `available_now` in SQL - same answer as
+        Doctor.is_available_now(): a materialized on-duty interval contains now
+        """
+        from datetime import datetime
+        from .availability import ensure_timeline, to_aware
+        now = now or datetime.now()
+        ensure_timeline(now)
+        return self.annotate(
+            available_now=models.Exists(AvailabilityInterval.objects.filter(
+                doctor=models.OuterRef('pk'),
+                starts_at__lte=to_aware(now),
+                ends_at__gte=to_aware(now)
+            ))
+        )
+
+
 class Doctor(models.Model):
     """Doctor model for storing doctor information"""
     
@@ -193,6 +254,38 @@ class Doctor(models.Model):
         help_text='Hospital/Clinic address in English'
     )
     
+    # Cleaned display fields (HTML stripped), filled in save()
+    clean_specialty = models.CharField(
+        max_length=200,
+        blank=True,
+        editable=False,
+        verbose_name='বিশেষত্ব (পরিষ্কার)'
+    )
+    clean_specialty_en = models.CharField(
+        max_length=200,
+        blank=True,
+        editable=False,
+        verbose_name='Specialty (English, clean)'
+    )
+    clean_hospital = models.CharField(
+        max_length=200,
+        blank=True,
+        editable=False,
+        verbose_name='হাসপাতাল (পরিষ্কার)'
+    )
+    clean_hospital_en = models.CharField(
+        max_length=200,
+        blank=True,
+        editable=False,
+        verbose_name='Hospital (English, clean)'
+    )
+    clean_contact = models.CharField(
+        max_length=200,
+        blank=True,
+        editable=False,
+        verbose_name='যোগাযোগ (পরিষ্কার)'
+    )
+    
     # Category relationships
     categories = models.ManyToManyField(
         Category, 
@@ -269,6 +362,8 @@ class Doctor(models.Model):
         help_text='জরুরি তথ্য শেষ আপডেট হওয়ার সময়'
     )
     
+    objects = DoctorQuerySet.as_manager()
+    
     class Meta:
         verbose_name = 'ডাক্তার'
         verbose_name_plural = 'ডাক্তারগণ'
@@ -329,20 +424,67 @@ class Doctor(models.Model):
         """Get translated emergency note"""
         return self.get_translated_field('emergency_note', language)
     
-    def get_clean_hospital(self):
+    # Cleaned display field -> (source field, cleaner)
+    CLEAN_FIELDS = {
+        'clean_specialty': ('specialty', 'clean_text'),
+        'clean_specialty_en': ('specialty_en', 'clean_text'),
+        'clean_hospital': ('hospital', 'clean_text'),
+        'clean_hospital_en': ('hospital_en', 'clean_text'),
+        'clean_contact': ('contact', 'clean_contact_text'),
+    }
+    
+    def save(self, *args, **kwargs):
+        update_fields = kwargs.get('update_fields')
+        if update_fields is None:
+            self.update_clean_fields()
+        else:
+            changed = [
+                clean_field for clean_field, (source, _) in self.CLEAN_FIELDS.items()
+                if source in update_fields
+            ]
+            if changed:
+                self.update_clean_fields(changed)
+                kwargs['update_fields'] = set(update_fields) | set(changed)
+        super().save(*args, **kwargs)
+    
+    def update_clean_fields(self, fields=None):
+        """Recompute cleaned display fields from their source fields"""
+        for clean_field in (fields or self.CLEAN_FIELDS):
+            source, cleaner = self.CLEAN_FIELDS[clean_field]
+            setattr(self, clean_field, getattr(self, cleaner)(getattr(self, source)))
+    
+    def _get_clean_field(self, clean_field, language=None):
+        """
+        Read a cleaned display field for the language
+        Rows saved before the field existed fall back to cleaning the source
+        """
+        value = self.get_translated_field(clean_field, language)
+        if value:
+            return value
+        source, cleaner = self.CLEAN_FIELDS[clean_field]
+        if source in self.get_deferred_fields():
+            return ''
+        return getattr(self, cleaner)(getattr(self, source))
+    
+    def get_clean_hospital(self, language=None):
         """Get hospital name without HTML tags"""
-        return self.clean_text(self.hospital)
+        return self._get_clean_field('clean_hospital', language)
     
-    def get_clean_specialty(self):
+    def get_clean_specialty(self, language=None):
         """Get specialty without HTML tags"""
-        return self.clean_text(self.specialty)
+        return self._get_clean_field('clean_specialty', language)
     
     def get_clean_contact(self):
         """Get contact info with commas instead of line breaks"""
-        if not self.contact:
+        return self._get_clean_field('clean_contact')
+    
+    @staticmethod
+    def clean_contact_text(text):
+        """Replace line breaks with commas, remove HTML tags"""
+        if not text:
             return ''
         # Replace <br> tags with comma and space
-        text = re.sub(r'<br\s*/?>', ', ', self.contact, flags=re.IGNORECASE)
+        text = re.sub(r'<br\s*/?>', ', ', text, flags=re.IGNORECASE)
         # Remove other HTML tags
         text = strip_tags(text)
         # Clean up multiple spaces
@@ -372,7 +514,7 @@ class Doctor(models.Model):
             return first_category.name
         
         # Fallback to old method for backwards compatibility
-        specialty_lower = self.specialty.lower() if self.specialty else ''
+        specialty_lower = self.get_clean_specialty('bn').lower()
         
         for category, keywords in self.CATEGORY_MAPPING.items():
             for keyword in keywords:
@@ -406,51 +548,17 @@ class Doctor(models.Model):
                 self.primary_category = assigned_categories[0]
                 self.save(update_fields=['primary_category'])
     
+    def _availability(self):
+        """Availability index of this doctor - shared by a whole page when attached in bulk"""
+        from .availability import AvailabilityIndex
+        index = getattr(self, '_availability_index', None)
+        if index is None:
+            index = self._availability_index = AvailabilityIndex.load([self.pk])
+        return index
+    
     def is_available_now(self):
         """বর্তমান সময়ে জরুরি সেবা উপলব্ধ কিনা চেক করে (Phase 2)"""
-        from datetime import date, datetime
-        
-        # Check if doctor has 24/7 availability flag
-        if self.is_24_7_available:
-            # Check if on leave
-            today = date.today()
-            on_leave = self.leaves.filter(
-                start_date__lte=today,
-                end_date__gte=today
-            ).first()
-            
-            if on_leave and not on_leave.is_emergency_available:
-                return False
-            return True
-        
-        # Check emergency schedules
-        if self.is_emergency_available:
-            now = datetime.now()
-            current_day = now.weekday()
-            current_time = now.time()
-            
-            # Check if on leave
-            today = date.today()
-            on_leave = self.leaves.filter(
-                start_date__lte=today,
-                end_date__gte=today
-            ).first()
-            
-            if on_leave and not on_leave.is_emergency_available:
-                return False
-            
-            # Check if any schedule matches current time
-            available_schedule = self.emergency_schedules.filter(
-                day_of_week=current_day,
-                start_time__lte=current_time,
-                end_time__gte=current_time,
-                is_active=True,
-                is_emergency=True
-            ).exists()
-            
-            return available_schedule
-        
-        return False
+        return self._availability().is_available_now(self)
     
     def get_today_schedule(self):
         """আজকের সময়সূচী রিটার্ন করে"""
@@ -465,40 +573,7 @@ class Doctor(models.Model):
     
     def get_next_available_time(self):
         """পরবর্তী উপলব্ধ সময় রিটার্ন করে"""
-        from datetime import datetime, timedelta
-        
-        if self.is_24_7_available:
-            return "এখনই উপলব্ধ (২৪/৭)"
-        
-        now = datetime.now()
-        current_day = now.weekday()
-        current_time = now.time()
-        
-        # Check today's remaining schedules
-        today_schedules = self.emergency_schedules.filter(
-            day_of_week=current_day,
-            start_time__gt=current_time,
-            is_active=True,
-            is_emergency=True
-        ).order_by('start_time').first()
-        
-        if today_schedules:
-            return f"আজ {today_schedules.start_time.strftime('%H:%M')} এ"
-        
-        # Check next 7 days
-        for i in range(1, 8):
-            next_day = (current_day + i) % 7
-            next_schedule = self.emergency_schedules.filter(
-                day_of_week=next_day,
-                is_active=True,
-                is_emergency=True
-            ).order_by('start_time').first()
-            
-            if next_schedule:
-                day_names = ['সোমবার', 'মঙ্গলবার', 'বুধবার', 'বৃহস্পতিবার', 'শুক্রবার', 'শনিবার', 'রবিবার']
-                return f"{day_names[next_day]} {next_schedule.start_time.strftime('%H:%M')} এ"
-        
-        return "সময়সূচী নেই"
+        return self._availability().next_available_time(self)
     
     image = models.ImageField(
         upload_to='doctor_images/',
@@ -651,7 +726,7 @@ class DoctorView(models.Model):
         verbose_name='ডাক্তার'
     )
     viewed_at = models.DateTimeField(
-        auto_now_add=True,
+        default=timezone.now,
         verbose_name='দেখার সময়'
     )
     ip_address = models.GenericIPAddressField(
@@ -688,6 +763,35 @@ class DoctorView(models.Model):
         return f'{self.doctor.name} - {self.viewed_at.strftime("%Y-%m-%d %H:%M")}'
 
 
+class DoctorViewHourly(models.Model):
+    """ঘণ্টাভিত্তিক ভিউ সংখ্যা - popular/trending র‍্যাংকিং এর জন্য"""
+    doctor = models.ForeignKey(
+        Doctor,
+        on_delete=models.CASCADE,
+        related_name='hourly_views',
+        verbose_name='ডাক্তার'
+    )
+    hour = models.DateTimeField(
+        verbose_name='ঘণ্টা'
+    )
+    views = models.IntegerField(
+        default=0,
+        verbose_name='ভিউ'
+    )
+    
+    class Meta:
+        ordering = ['-hour']
+        verbose_name = 'ঘণ্টাভিত্তিক ভিউ'
+        verbose_name_plural = 'ঘণ্টাভিত্তিক ভিউসমূহ'
+        unique_together = ['doctor', 'hour']
+        indexes = [
+            models.Index(fields=['hour', 'doctor']),
+        ]
+    
+    def __str__(self):
+        return f'{self.doctor.name} - {self.hour.strftime("%Y-%m-%d %H:00")} ({self.views})'
+
+
 class SearchQuery(models.Model):
     """সার্চ কোয়েরি ট্র্যাকিং"""
     query = models.CharField(
@@ -734,6 +838,86 @@ class SearchQuery(models.Model):
         return f'"{self.query}" - {self.result_count} ফলাফল'
 
 
+class SearchQueryDaily(models.Model):
+    """দৈনিক সার্চ টার্ম সংখ্যা - পুরনো SearchQuery সারির সংক্ষিপ্ত রূপ"""
+    date = models.DateField(
+        verbose_name='তারিখ'
+    )
+    query = models.CharField(
+        max_length=255,
+        verbose_name='সার্চ টার্ম'
+    )
+    count = models.IntegerField(
+        default=0,
+        verbose_name='সার্চ সংখ্যা'
+    )
+    
+    class Meta:
+        ordering = ['-date', '-count']
+        verbose_name = 'দৈনিক সার্চ টার্ম'
+        verbose_name_plural = 'দৈনিক সার্চ টার্মসমূহ'
+        unique_together = ['date', 'query']
+    
+    def __str__(self):
+        return f'{self.date} - "{self.query}" ({self.count})'
+
+
+class DailySketch(models.Model):
+    """দৈনিক স্কেচ - ইউনিক ভিজিটর/সার্চ (HyperLogLog) ও জনপ্রিয় সার্চ (SpaceSaving)"""
+    VISITORS = 'visitors'
+    SEARCH_TERMS = 'search_terms'
+    TOP_SEARCH_TERMS = 'top_search_terms'
+    KIND_CHOICES = [
+        (VISITORS, 'ইউনিক ভিজিটর'),
+        (SEARCH_TERMS, 'ইউনিক সার্চ টার্ম'),
+        (TOP_SEARCH_TERMS, 'জনপ্রিয় সার্চ টার্ম'),
+    ]
+    
+    date = models.DateField(
+        verbose_name='তারিখ'
+    )
+    kind = models.CharField(
+        max_length=20,
+        choices=KIND_CHOICES,
+        verbose_name='ধরন'
+    )
+    doctor = models.ForeignKey(
+        Doctor,
+        on_delete=models.CASCADE,
+        null=True,
+        blank=True,
+        related_name='daily_sketches',
+        verbose_name='ডাক্তার'
+    )
+    data = models.BinaryField(
+        verbose_name='স্কেচ'
+    )
+    
+    class Meta:
+        ordering = ['-date']
+        verbose_name = 'দৈনিক স্কেচ'
+        verbose_name_plural = 'দৈনিক স্কেচসমূহ'
+        constraints = [
+            models.UniqueConstraint(fields=['date', 'kind', 'doctor'], name='unique_daily_sketch'),
+            # Site-wide sketches have no doctor - NULLs aren't equal in a unique index
+            models.UniqueConstraint(
+                fields=['date', 'kind'],
+                condition=models.Q(doctor__isnull=True),
+                name='unique_site_daily_sketch'
+            ),
+        ]
+    
+    def __str__(self):
+        return f'{self.date} - {self.kind}' + (f' - {self.doctor_id}' if self.doctor_id else '')
+    
+    @property
+    def sketch(self):
+        from .sketches import HyperLogLog, SpaceSaving
+        if self.kind == self.TOP_SEARCH_TERMS:
+            return SpaceSaving.from_bytes(self.data)
+        return HyperLogLog.from_bytes(self.data)
+
+
 class DailyStats(models.Model):
     """দৈনিক পরিসংখ্যান"""
     date = models.DateField(
@@ -769,6 +953,11 @@ class DailyStats(models.Model):
         blank=True,
         verbose_name='সর্বাধিক সার্চ টার্ম'
     )
+    is_compacted = models.BooleanField(
+        default=False,
+        verbose_name='কম্প্যাক্ট হয়েছে',
+        help_text='কাঁচা ভিউ/সার্চ মুছে ফেলা হয়েছে - পরিসংখ্যান আর নতুন করে গণনা হবে না'
+    )
     
     class Meta:
         ordering = ['-date']
@@ -914,3 +1103,31 @@ class DoctorLeave(models.Model):
         from datetime import date
         today = date.today()
         return self.start_date <= today <= self.end_date
+
+
+class AvailabilityInterval(models.Model):
+    """
+    আগামী কয়েক দিনের নির্দিষ্ট জরুরি সেবার সময় (materialized)
+    EmergencySchedule থেকে তৈরি, ছুটির দিন বাদে; ২৪/৭ ডাক্তারের পুরো দিন।
+    doctors.availability.rebuild_timeline() দিয়ে আপডেট হয়
+    """
+    doctor = models.ForeignKey(
+        Doctor,
+        on_delete=models.CASCADE,
+        related_name='availability_intervals',
+        verbose_name='ডাক্তার'
+    )
+    starts_at = models.DateTimeField(verbose_name='শুরু')
+    ends_at = models.DateTimeField(verbose_name='শেষ')
+    
+    class Meta:
+        ordering = ['starts_at']
+        verbose_name = 'উপলব্ধ সময়'
+        verbose_name_plural = 'উপলব্ধ সময়সমূহ'
+        indexes = [
+            models.Index(fields=['starts_at', 'ends_at']),
+            models.Index(fields=['doctor', 'starts_at']),
+        ]
+    
+    def __str__(self):
+        return f'{self.doctor.name} - {timezone.localtime(self.starts_at):%d/%m %H:%M} - {timezone.localtime(self.ends_at):%H:%M}'
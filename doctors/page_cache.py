@@ -0,0 +1,175 @@
+# -*- coding: utf-8 -*-
+"""
+Full-page cache for anonymous visitors
+
+Public pages only change when admins edit data, so an anonymous GET is
+rendered once and then served from the shared cache by every worker.
+Keys cover the language, path, normalized query string and AJAX mode plus
+a generation token that signals bump on every data change. Entries also
+expire at the next emergency schedule boundary, when "available now"
+badges flip.
+"""
+import hashlib
+import math
+import re
+from datetime import datetime, time, timedelta
+from functools import wraps
+
+from django.conf import settings
+from django.contrib.messages import get_messages
+from django.core.cache import cache
+from django.http import HttpResponse
+from django.middleware.csrf import get_token
+from django.utils.cache import patch_vary_headers
+from django.utils.http import urlencode
+
+from .utils import is_ajax
+from .versioning import bump_cache_generation, cache_generation
+
+
+PAGE_CACHE_TIMEOUT = getattr(settings, 'PAGE_CACHE_TIMEOUT', 5 * 60)
+PAGE_GENERATION_CACHE_KEY = 'doctors:page_generation'
+
+# Link tracking parameters that don't change the page
+IGNORED_PARAMS = {'fbclid', 'gclid'}
+
+# Cached pages carry the CSRF token of whoever rendered them (language form)
+CSRF_INPUT_RE = re.compile(rb'(name="csrfmiddlewaretoken" value=")[^"]*(")')
+
+
+def page_generation():
+    return cache_generation(PAGE_GENERATION_CACHE_KEY)
+
+
+def bump_page_generation():
+    """Invalidate every cached page"""
+    bump_cache_generation(PAGE_GENERATION_CACHE_KEY)
+
+
+def normalized_query(request):
+    """Sorted query string without blank values and tracking parameters"""
+    params = sorted(
+        (key, value)
+        for key, values in request.GET.lists()
+        if key not in IGNORED_PARAMS and not key.startswith('utm_')
+        for value in values
+        if value
+    )
+    return urlencode(params)
+
+
+def page_cache_key(request):
+    raw = '|'.join([
+        request.LANGUAGE_CODE,
+        request.path,
+        normalized_query(request),
+        'ajax' if is_ajax(request) else 'page',
+    ])
+    digest = hashlib.md5(raw.encode('utf-8')).hexdigest()
+    return f'doctors:page:{page_generation()}:{digest}'
+
+
+def availability_window(now=None):
+    """
+    (start, end) around `now` in which no materialized on-duty interval
+    starts or ends, so no "available now" badge can change. Bounded by
+    midnight, when the weekday changes; same local clock as
+    Doctor.is_available_now()
+    """
+    from .availability import ensure_timeline, to_aware, to_local
+    from .models import AvailabilityInterval
+
+    now = now or datetime.now()
+    ensure_timeline(now)
+    start = datetime.combine(now.date(), time.min)
+    end = start + timedelta(days=1)
+    boundaries = AvailabilityInterval.objects.filter(
+        starts_at__lt=to_aware(end),
+        ends_at__gte=to_aware(start),
+    ).values_list('starts_at', 'ends_at').distinct()
+    for starts_at, ends_at in boundaries:
+        # Available while starts_at <= now <= ends_at
+        for moment in (to_local(starts_at), to_local(ends_at) + timedelta(microseconds=1)):
+            if start < moment <= now:
+                start = moment
+            elif now < moment < end:
+                end = moment
+    return start, end
+
+
+def current_availability_window(version):
+    """availability_window(), shared between workers until it ends"""
+    cache_key = f'doctors:availability_window:{version.token}'
+    now = datetime.now()
+    window = cache.get(cache_key)
+    if window is None or not window[0] <= now < window[1]:
+        window = availability_window(now)
+        cache.set(cache_key, window, max(1, int((window[1] - now).total_seconds())))
+    return window
+
+
+def seconds_until_availability_change(now=None):
+    now = now or datetime.now()
+    return max(1, math.ceil((availability_window(now)[1] - now).total_seconds()))
+
+
+def _can_use_cache(request):
+    """Only cookie-less anonymous GETs - a session may mean a logged-in user or flashed messages"""
+    return (
+        request.method in ('GET', 'HEAD')
+        and settings.SESSION_COOKIE_NAME not in request.COOKIES
+        and 'messages' not in request.COOKIES
+    )
+
+
+def _can_store(request, response):
+    return (
+        response.status_code == 200
+        and not response.streaming
+        and not response.cookies
+        and not len(get_messages(request))
+    )
+
+
+def _cached_response(request, entry):
+    content, content_type, vary = entry
+    if b'csrfmiddlewaretoken' in content:
+        token = get_token(request).encode('ascii')
+        content = CSRF_INPUT_RE.sub(lambda match: match.group(1) + token + match.group(2), content)
+    response = HttpResponse(content, content_type=content_type)
+    # Logged-in users get a different page - never let a proxy reuse this one
+    patch_vary_headers(response, vary + ['Cookie'])
+    return response
+
+
+def anonymous_page_cache(on_hit=None, uncached_params=()):
+    """
+    View decorator serving anonymous GETs from the page cache
+    `on_hit(request, *args, **kwargs)` runs for cached responses (view
+    tracking); requests with any of `uncached_params` always render.
+    Both are kept on the view for ConditionalDirectoryMiddleware's 304s.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            if not _can_use_cache(request) or any(request.GET.get(param) for param in uncached_params):
+                return view(request, *args, **kwargs)
+
+            key = page_cache_key(request)
+            entry = cache.get(key)
+            if entry is not None:
+                if on_hit is not None:
+                    on_hit(request, *args, **kwargs)
+                return _cached_response(request, entry)
+
+            response = view(request, *args, **kwargs)
+            if _can_store(request, response):
+                vary = [header.strip() for header in response.get('Vary', '').split(',') if header.strip()]
+                entry = (response.content, response['Content-Type'], vary)
+                timeout = min(PAGE_CACHE_TIMEOUT, seconds_until_availability_change())
+                cache.set(key, entry, timeout)
+            return response
+        wrapper.page_cache_on_hit = on_hit
+        wrapper.page_cache_uncached_params = uncached_params
+        return wrapper
+    return decorator
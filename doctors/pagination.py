@@ -0,0 +1,257 @@
+# -*- coding: utf-8 -*-
+"""
+Keyset (cursor) pagination for the listing views
+
+Pages are fetched with a WHERE clause on the ordering columns of the last
+row seen instead of COUNT(*) + OFFSET, so deep pages and AJAX "next page"
+requests cost the same as the first one. Cursors are signed, opaque tokens.
+Numbered ?page=N links from before cursors (bookmarks, search engines)
+still open the same page: it is located once with an OFFSET query and
+paging continues with cursors from there.
+"""
+from django.core import signing
+from django.core.exceptions import FieldDoesNotExist, ValidationError
+from django.db.models import Q
+from django.utils.functional import cached_property
+
+
+# Doctor.Meta.ordering with the primary key as a unique tie-breaker
+DOCTOR_ORDERING = ('-is_emergency_available', '-is_24_7_available', 'name', 'id')
+
+# Emergency page "available now first" (needs with_available_now())
+AVAILABLE_ORDERING = ('-available_now',) + DOCTOR_ORDERING
+
+# Relevance order of search_doctors() results (paginate_ids)
+SEARCH_ORDERING = ('search_rank', 'id')
+
+CURSOR_PARAM = 'cursor'
+LEGACY_PAGE_PARAM = 'page'
+CURSOR_SALT = 'doctors.pagination'
+
+
+class CursorPage:
+    """
+    One page of results plus the cursors pointing to its neighbours
+    `count` (total number of results) is computed on first use and at most
+    once; it needs no query when everything fits on this page.
+    """
+
+    def __init__(self, object_list, has_next, has_previous, next_cursor, previous_cursor, query_params, count=None):
+        self.object_list = object_list
+        self.has_next = has_next
+        self.has_previous = has_previous
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
+        self._query_params = query_params
+        self._count = count
+
+    @cached_property
+    def count(self):
+        if not self.has_next and not self.has_previous:
+            return len(self.object_list)
+        return self._count() if callable(self._count) else self._count
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def has_other_pages(self):
+        return self.has_next or self.has_previous
+
+    def _querystring(self, cursor):
+        params = self._query_params.copy()
+        params.pop(CURSOR_PARAM, None)
+        params.pop(LEGACY_PAGE_PARAM, None)
+        if cursor:
+            params[CURSOR_PARAM] = cursor
+        return params.urlencode()
+
+    @property
+    def next_querystring(self):
+        return self._querystring(self.next_cursor)
+
+    @property
+    def previous_querystring(self):
+        return self._querystring(self.previous_cursor)
+
+    @property
+    def first_querystring(self):
+        return self._querystring(None)
+
+
+def _parse_ordering(ordering):
+    return [(field[1:], True) if field.startswith('-') else (field, False) for field in ordering]
+
+
+def _row_value(row, field):
+    if isinstance(row, dict):
+        return row[field]
+    return getattr(row, field)
+
+
+def _json_value(value):
+    # Dates and datetimes travel as ISO strings
+    return value.isoformat() if hasattr(value, 'isoformat') else value
+
+
+def _to_python(model, field, value):
+    """Restore a cursor value (JSON) to the Python type of the model field"""
+    try:
+        model_field = model._meta.pk if field in ('pk', 'id') else model._meta.get_field(field)
+    except FieldDoesNotExist:
+        return value  # annotation
+    return model_field.to_python(value)
+
+
+def encode_cursor(direction, values):
+    return signing.dumps([direction, values], salt=CURSOR_SALT, compress=True)
+
+
+def decode_cursor(cursor, model, ordering):
+    """Return (direction, values) of a cursor token, or None if it is invalid"""
+    try:
+        direction, values = signing.loads(cursor, salt=CURSOR_SALT)
+    except (signing.BadSignature, ValueError, TypeError):
+        return None
+    if direction not in ('next', 'previous') or len(values) != len(ordering):
+        return None
+    try:
+        values = [_to_python(model, field, value) for (field, _), value in zip(ordering, values)]
+    except ValidationError:
+        return None
+    return direction, values
+
+
+def _keyset_filter(ordering, values, forward):
+    """
+    Q selecting the rows after (forward) or before the given key:
+    (a > x) OR (a = x AND b > y) OR ...
+    """
+    condition = Q()
+    equal = Q()
+    for (field, descending), value in zip(ordering, values):
+        lookup = 'lt' if descending == forward else 'gt'
+        condition |= equal & Q(**{f'{field}__{lookup}': value})
+        equal &= Q(**{field: value})
+    return condition
+
+
+def legacy_offset(request, per_page):
+    """
+    Row offset of a numbered ?page=N link (0 without one)
+    Like the old Paginator code, junk page numbers mean the first page.
+    """
+    if request.GET.get(CURSOR_PARAM):
+        return 0
+    try:
+        page = int(request.GET.get(LEGACY_PAGE_PARAM, 1))
+    except (TypeError, ValueError):
+        return 0
+    return max(page - 1, 0) * per_page
+
+
+def _legacy_cursor_values(queryset, ordering, parsed, offset, per_page):
+    """Ordering values of the row just before `offset` - pages past the end open the last page"""
+    fields = [field for field, _ in parsed]
+    rows = queryset.order_by(*ordering).values_list(*fields)
+    boundary = list(rows[offset - 1:offset])
+    if not boundary:
+        count = queryset.count()
+        offset = (count - 1) // per_page * per_page if count else 0
+        boundary = list(rows[offset - 1:offset]) if offset else []
+    return list(boundary[0]) if boundary else None
+
+
+def paginate(request, queryset, ordering=DOCTOR_ORDERING, per_page=20):
+    """
+    Return a CursorPage of `queryset` for the cursor in request.GET
+    `ordering` must end with a unique, non-null field
+    """
+    parsed = _parse_ordering(ordering)
+    cursor = decode_cursor(request.GET.get(CURSOR_PARAM, ''), queryset.model, parsed)
+    direction, values = cursor if cursor else ('next', None)
+    forward = direction == 'next'
+    if cursor is None:
+        offset = legacy_offset(request, per_page)
+        if offset:
+            values = _legacy_cursor_values(queryset, ordering, parsed, offset, per_page)
+
+    if forward:
+        order_by = list(ordering)
+    else:
+        order_by = [field if descending else f'-{field}' for field, descending in parsed]
+
+    rows = queryset.order_by(*order_by)
+    if values is not None:
+        rows = rows.filter(_keyset_filter(parsed, values, forward))
+    rows = list(rows[:per_page + 1])
+    has_more = len(rows) > per_page
+    rows = rows[:per_page]
+
+    if forward:
+        has_next, has_previous = has_more, values is not None
+    else:
+        rows.reverse()
+        has_next, has_previous = True, has_more
+
+    def row_cursor(direction, row):
+        return encode_cursor(direction, [_json_value(_row_value(row, field)) for field, _ in parsed])
+
+    return CursorPage(
+        rows,
+        has_next=has_next,
+        has_previous=has_previous,
+        next_cursor=row_cursor('next', rows[-1]) if rows and has_next else None,
+        previous_cursor=row_cursor('previous', rows[0]) if rows and has_previous else None,
+        query_params=request.GET,
+        count=queryset.count,
+    )
+
+
+def paginate_ids(request, queryset, ids, per_page=20):
+    """
+    Return a CursorPage of an already ordered list of primary keys (cached
+    search results). Only the rows of the page are loaded; cursors have
+    the (search_rank, id) form of SEARCH_ORDERING.
+    """
+    parsed = _parse_ordering(SEARCH_ORDERING)
+    cursor = decode_cursor(request.GET.get(CURSOR_PARAM, ''), queryset.model, parsed)
+    direction, values = cursor if cursor else ('next', None)
+
+    start = 0
+    if cursor is None:
+        # Numbered link: pages past the end open the last page
+        start = min(legacy_offset(request, per_page), max(len(ids) - 1, 0) // per_page * per_page)
+    if values is not None:
+        rank, pk = values
+        try:
+            position = ids.index(pk)
+        except ValueError:
+            # The row left the results since the cursor was made
+            position = min(max(rank, 0), len(ids))
+        if direction == 'next':
+            start = position + 1
+        else:
+            start = max(position - per_page, 0)
+    page_ids = ids[start:start + per_page]
+
+    rows = queryset.in_bulk(page_ids)
+    object_list = []
+    for rank, pk in enumerate(page_ids, start):
+        if pk in rows:
+            rows[pk].search_rank = rank
+            object_list.append(rows[pk])
+
+    has_next = start + per_page < len(ids)
+    has_previous = start > 0
+    return CursorPage(
+        object_list,
+        has_next=has_next,
+        has_previous=has_previous,
+        next_cursor=encode_cursor('next', [start + len(page_ids) - 1, page_ids[-1]]) if page_ids and has_next else None,
+        previous_cursor=encode_cursor('previous', [start, page_ids[0]]) if page_ids and has_previous else None,
+        query_params=request.GET,
+        count=len(ids),
+    )
@@ -0,0 +1,589 @@
+# -*- coding: utf-8 -*-
+"""
+In-process search engine for the doctor directory
+
+Keeps a token -> posting list inverted index of all active doctors, so the
+listing views get ranked primary keys back instead of running
+LIKE '%q%' scans over the TEXT columns on every keystroke.
+"""
+import hashlib
+import re
+import threading
+import time
+import unicodedata
+import uuid
+from bisect import bisect_left, insort
+
+from django.core.cache import cache
+from django.utils.html import strip_tags
+
+from .versioning import bump_cache_generation, cache_generation
+
+
+# Indexed fields and the score a match in that field is worth.
+# The English counterpart (<field>_en) of every field is indexed too.
+SEARCH_FIELDS = {
+    'name': 4.0,
+    'specialty': 3.0,
+    'hospital': 2.0,
+    'qualification': 1.0,
+}
+
+# A query token that is only a prefix of an indexed token scores less
+# than an exact token match
+PREFIX_MATCH_FACTOR = 0.5
+
+# Fields that take part in typo-tolerant (trigram) matching
+FUZZY_FIELDS = ('name', 'specialty', 'hospital')
+
+# Score factors for matches that needed spelling folding, transliteration
+# of a romanized query, or trigram similarity
+FOLDED_MATCH_FACTOR = 0.9
+TRANSLITERATED_MATCH_FACTOR = 0.8
+TRIGRAM_MATCH_FACTOR = 0.5
+
+# Minimum trigram similarity (shared / all trigrams, as in pg_trgm) for a
+# misspelled query token to match an indexed token
+TRIGRAM_THRESHOLD = 0.4
+
+# Cache key holding the index version, bumped on every Doctor change so
+# other worker processes know their copy is stale
+INDEX_VERSION_CACHE_KEY = 'doctors:search_index_version'
+
+# Rebuild the index at least this often (seconds), in case a change was
+# made without signals (queryset.update(), raw SQL, another worker with a
+# process-local cache backend)
+INDEX_MAX_AGE = 15 * 60
+
+# Shared cache of search results (ordered ids). Every key embeds the
+# current generation; bumping it from the signal handlers orphans all
+# cached results at once.
+RESULTS_GENERATION_CACHE_KEY = 'doctors:search_results_generation'
+RESULTS_CACHE_TIMEOUT = 10 * 60
+
+# Bengali letters, vowel signs (kar), hasanta, nukta and khanda-ta all
+# live in U+0980-U+09FF. The combining signs are not matched by \w, so a
+# plain \w+ would split "ক্ষ" or "গাইনী" into pieces.
+TOKEN_RE = re.compile('[\\w\u0980-\u09FF]+')
+BR_TAG_RE = re.compile(r'<br\s*/?>', re.IGNORECASE)
+ZERO_WIDTH_RE = re.compile('[\u200c\u200d\ufeff]')
+
+
+def normalize(text):
+    """
+    Normalize text for indexing and querying
+    NFC keeps composed/decomposed Bengali (e.g. য় vs য + ়) equal,
+    zero-width joiners are dropped and Latin text is case folded
+    """
+    if not text:
+        return ''
+    text = unicodedata.normalize('NFC', text)
+    text = ZERO_WIDTH_RE.sub('', text)
+    return text.casefold()
+
+
+def tokenize(text):
+    """Split (possibly HTML) text into normalized search tokens"""
+    if not text:
+        return []
+    text = BR_TAG_RE.sub(' ', text)
+    text = strip_tags(text)
+    return TOKEN_RE.findall(normalize(text))
+
+
+# Spellings people use interchangeably. Applied to both indexed and query
+# tokens, so "গাইনি"/"গাইনী" or "সার্জন"/"সারজন" fold to the same key.
+FOLD_SEQUENCES = [
+    ('\u09a1\u09bc', '\u09b0'),  # ড় -> র
+    ('\u09a2\u09bc', '\u09b0'),  # ঢ় -> র
+    ('\u09c3', '\u09b0\u09bf'),  # ৃ -> রি
+]
+FOLD_TABLE = str.maketrans({
+    '\u09c0': '\u09bf',  # ী -> ি
+    '\u09c2': '\u09c1',  # ূ -> ু
+    '\u0988': '\u0987',  # ঈ -> ই
+    '\u098a': '\u0989',  # ঊ -> উ
+    '\u09a3': '\u09a8',  # ণ -> ন
+    '\u09b7': '\u09b6',  # ষ -> শ
+    '\u09b8': '\u09b6',  # স -> শ
+    '\u09af': '\u099c',  # য -> জ
+    '\u099f': '\u09a4',  # ট -> ত
+    '\u09a0': '\u09a5',  # ঠ -> থ
+    '\u09a1': '\u09a6',  # ড -> দ
+    '\u09a2': '\u09a7',  # ঢ -> ধ
+    '\u0999': '\u0982',  # ঙ -> ং
+    '\u09ce': '\u09a4',  # ৎ -> ত
+    '\u0981': None,       # ঁ chandrabindu
+    '\u0983': None,       # ঃ visarga
+    '\u09cd': None,       # ্ hasanta
+})
+
+
+def fold(token):
+    """Fold a normalized token to a spelling-insensitive key"""
+    for sequence, replacement in FOLD_SEQUENCES:
+        token = token.replace(sequence, replacement)
+    return token.translate(FOLD_TABLE)
+
+
+# Latin -> Bengali phonetic rules, longest spelling first
+TRANSLIT_CONSONANTS = {
+    'chh': 'ছ', 'kh': 'খ', 'gh': 'ঘ', 'ch': 'চ', 'jh': 'ঝ', 'th': 'থ',
+    'dh': 'ধ', 'ph': 'ফ', 'bh': 'ভ', 'sh': 'শ', 'ng': 'ং',
+    'k': 'ক', 'g': 'গ', 'c': 'চ', 'j': 'জ', 't': 'ত', 'd': 'ড', 'n': 'ন',
+    'p': 'প', 'f': 'ফ', 'b': 'ব', 'm': 'ম', 'r': 'র', 'l': 'ল', 's': 'স',
+    'h': 'হ', 'z': 'জ', 'q': 'ক', 'v': 'ভ', 'x': 'ক্স', 'y': 'য়',
+}
+# (independent letter, vowel sign); 'o' after a consonant is the inherent vowel
+TRANSLIT_VOWELS = {
+    'oi': ('ঐ', 'ৈ'), 'ou': ('ঔ', 'ৌ'), 'ee': ('ঈ', 'ী'), 'oo': ('উ', 'ু'),
+    'a': ('আ', 'া'), 'i': ('ই', 'ি'), 'u': ('উ', 'ু'), 'e': ('এ', 'ে'),
+    'o': ('অ', ''), 'w': ('ও', 'ো'),
+}
+TRANSLIT_KEYS = sorted(list(TRANSLIT_CONSONANTS) + list(TRANSLIT_VOWELS), key=len, reverse=True)
+LATIN_TOKEN_RE = re.compile('^[a-z]+$')
+
+# English / romanized words whose spelling the phonetic rules can't follow
+# ("gyne" is not read like "gaini") -> the Bengali words used in the data.
+# A query token also matches the synonyms it is a prefix of.
+ROMANIZED_SYNONYMS = {
+    'gyne': ('গাইনি',),
+    'gynae': ('গাইনি',),
+    'gynecology': ('গাইনি', 'স্ত্রীরোগ'),
+    'gynaecology': ('গাইনি', 'স্ত্রীরোগ'),
+    'gynecologist': ('গাইনি', 'স্ত্রীরোগ'),
+    'gynaecologist': ('গাইনি', 'স্ত্রীরোগ'),
+    'obstetrics': ('প্রসূতি',),
+    'medicine': ('মেডিসিন',),
+    'diabetes': ('ডায়াবেটিস',),
+    'surgery': ('সার্জারি',),
+    'surgeon': ('সার্জন',),
+    'child': ('শিশু',),
+    'children': ('শিশু',),
+    'pediatric': ('শিশু', 'পেডিয়াট্রিক'),
+    'paediatric': ('শিশু', 'পেডিয়াট্রিক'),
+    'pediatrics': ('শিশু', 'পেডিয়াট্রিক'),
+    'heart': ('হৃদরোগ', 'হার্ট'),
+    'cardiology': ('হৃদরোগ', 'কার্ডিও'),
+    'cardiac': ('হৃদরোগ', 'কার্ডিও'),
+    'skin': ('চর্ম', 'স্কিন'),
+    'dermatology': ('চর্ম',),
+    'eye': ('চক্ষু',),
+    'ophthalmology': ('চক্ষু',),
+    'dental': ('ডেন্টাল', 'দন্ত'),
+    'dentist': ('ডেন্টাল', 'দন্ত'),
+    'orthopedic': ('অর্থো', 'হাড়'),
+    'orthopaedic': ('অর্থো', 'হাড়'),
+    'bone': ('হাড়',),
+    'ent': ('নাক', 'ইএনটি'),
+    'kidney': ('কিডনী',),
+    'nephrology': ('কিডনী', 'নেফ্রো'),
+    'psychiatry': ('মানসিক', 'সাইকিয়াট্রি'),
+    'neurology': ('নিউরো',),
+    'neuro': ('নিউরো',),
+    'ultrasound': ('আল্ট্রা',),
+}
+ROMANIZED_SYNONYM_KEYS = sorted(ROMANIZED_SYNONYMS)
+
+# Shortest query token completed to synonyms it is a prefix of
+SYNONYM_PREFIX_MIN_LENGTH = 3
+
+
+def romanized_synonyms(token):
+    """{Bengali word: exact} for the synonyms of a Latin token (or of words it starts)"""
+    words = {}
+    if token in ROMANIZED_SYNONYMS:
+        for word in ROMANIZED_SYNONYMS[token]:
+            words[word] = True
+    if len(token) >= SYNONYM_PREFIX_MIN_LENGTH:
+        for key in _expand(ROMANIZED_SYNONYM_KEYS, token):
+            for word in ROMANIZED_SYNONYMS[key]:
+                words.setdefault(word, False)
+    return words
+
+
+def transliterate(token):
+    """
+    Transliterate a romanized (Latin) token to Bengali script
+    e.g. "gaini" -> "গাইনি", "sarjon" -> "সার্জন"
+    """
+    result = []
+    previous = None  # 'consonant', 'phala' or 'vowel'
+    position = 0
+    while position < len(token):
+        for key in TRANSLIT_KEYS:
+            if token.startswith(key, position):
+                break
+        else:
+            result.append(token[position])
+            previous = None
+            position += 1
+            continue
+
+        if key in TRANSLIT_VOWELS:
+            letter, sign = TRANSLIT_VOWELS[key]
+            result.append(sign if previous in ('consonant', 'phala') else letter)
+            previous = 'vowel'
+        else:
+            if key == 'y' and previous == 'consonant':
+                result.append('্য')  # য-ফলা
+                previous = 'phala'
+            else:
+                if previous == 'consonant':
+                    result.append('্')  # conjunct
+                result.append(TRANSLIT_CONSONANTS[key])
+                previous = 'consonant'
+        position += len(key)
+    return ''.join(result)
+
+
+def trigrams(token):
+    """Character trigrams of a token, padded like pg_trgm"""
+    padded = f'  {token} '
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+class DoctorSearchIndex:
+    """
+    Inverted index over the active doctors
+
+    Every token maps to a posting list {doctor pk: field bitmask}. The
+    vocabulary is kept sorted so partially typed query tokens are matched
+    by prefix with a binary search. A second, folded vocabulary absorbs
+    spelling variants and romanized queries, and a trigram index over it
+    catches typos.
+    """
+
+    def __init__(self, fields=None):
+        self.fields = dict(fields or SEARCH_FIELDS)
+        self._field_bits = {
+            field: 1 << position for position, field in enumerate(self.fields)
+        }
+        self._lock = threading.RLock()
+        self._postings = {}
+        self._vocabulary = []
+        self._doc_tokens = {}
+        self._order_keys = {}
+        self._folded = {}
+        self._folded_vocabulary = []
+        self._trigrams = {}
+        self._fuzzy_bits = 0
+        for field in FUZZY_FIELDS:
+            self._fuzzy_bits |= self._field_bits.get(field, 0)
+        self._version = None
+        self._built_at = 0
+
+    # Building / updating
+
+    def _load_fields(self):
+        """Model fields to load from the database for indexing"""
+        fields = ['pk', 'name', 'is_emergency_available', 'is_24_7_available']
+        for field in self.fields:
+            fields.extend([field, f'{field}_en'])
+        return fields
+
+    def _document(self, doctor):
+        """Map every token of a doctor to the bitmask of fields it occurs in"""
+        tokens = {}
+        for field, bit in self._field_bits.items():
+            for value in (getattr(doctor, field, ''), getattr(doctor, f'{field}_en', '')):
+                for token in tokenize(value):
+                    tokens[token] = tokens.get(token, 0) | bit
+        return tokens
+
+    @staticmethod
+    def _order_key(doctor):
+        """Tie-breaker matching Doctor.Meta.ordering"""
+        return (
+            not doctor.is_emergency_available,
+            not doctor.is_24_7_available,
+            doctor.name,
+            doctor.pk,
+        )
+
+    def build(self):
+        """(Re)build the whole index from the database"""
+        from .models import Doctor
+
+        doctors = Doctor.objects.filter(is_active=True).only(*self._load_fields())
+        with self._lock:
+            self._built_at = 0
+            self._postings = {}
+            self._vocabulary = []
+            self._doc_tokens = {}
+            self._order_keys = {}
+            self._folded = {}
+            self._folded_vocabulary = []
+            self._trigrams = {}
+            for doctor in doctors.iterator():
+                self._add(doctor)
+            self._vocabulary = sorted(self._postings)
+            for token in self._vocabulary:
+                self._add_folded(token)
+            self._folded_vocabulary = sorted(self._folded)
+            self._built_at = time.monotonic()
+            cache.add(INDEX_VERSION_CACHE_KEY, uuid.uuid4().hex, None)
+            self._version = cache.get(INDEX_VERSION_CACHE_KEY)
+
+    def _add(self, doctor):
+        document = self._document(doctor)
+        for token, mask in document.items():
+            posting = self._postings.get(token)
+            if posting is None:
+                posting = self._postings[token] = {}
+                if self._built_at:
+                    insort(self._vocabulary, token)
+                    self._add_folded(token)
+            posting[doctor.pk] = mask
+        self._doc_tokens[doctor.pk] = set(document)
+        self._order_keys[doctor.pk] = self._order_key(doctor)
+
+    def _remove(self, pk):
+        for token in self._doc_tokens.pop(pk, ()):
+            posting = self._postings.get(token)
+            if posting is None:
+                continue
+            posting.pop(pk, None)
+            if not posting:
+                del self._postings[token]
+                _remove_sorted(self._vocabulary, token)
+                self._remove_folded(token)
+        self._order_keys.pop(pk, None)
+
+    def _add_folded(self, token):
+        folded = fold(token)
+        tokens = self._folded.get(folded)
+        if tokens is None:
+            tokens = self._folded[folded] = set()
+            if self._built_at:
+                insort(self._folded_vocabulary, folded)
+            for trigram in trigrams(folded):
+                self._trigrams.setdefault(trigram, set()).add(folded)
+        tokens.add(token)
+
+    def _remove_folded(self, token):
+        folded = fold(token)
+        tokens = self._folded.get(folded)
+        if tokens is None:
+            return
+        tokens.discard(token)
+        if tokens:
+            return
+        del self._folded[folded]
+        _remove_sorted(self._folded_vocabulary, folded)
+        for trigram in trigrams(folded):
+            keys = self._trigrams.get(trigram)
+            if keys is not None:
+                keys.discard(folded)
+                if not keys:
+                    del self._trigrams[trigram]
+
+    def reindex_doctor(self, pk):
+        """Re-index a single doctor after it was saved"""
+        from .models import Doctor
+
+        with self._lock:
+            if not self._built_at:
+                return
+            doctor = Doctor.objects.filter(pk=pk, is_active=True).only(*self._load_fields()).first()
+            self._remove(pk)
+            if doctor is not None:
+                self._add(doctor)
+            self._version = self._bump_version()
+
+    def remove_doctor(self, pk):
+        """Drop a deleted doctor from the index"""
+        with self._lock:
+            if not self._built_at:
+                return
+            self._remove(pk)
+            self._version = self._bump_version()
+
+    @staticmethod
+    def _bump_version():
+        version = uuid.uuid4().hex
+        cache.set(INDEX_VERSION_CACHE_KEY, version, None)
+        return version
+
+    def _ensure_fresh(self):
+        """Build the index on first use and rebuild it when it went stale"""
+        with self._lock:
+            stale = (
+                not self._built_at
+                or time.monotonic() - self._built_at > INDEX_MAX_AGE
+                or cache.get(INDEX_VERSION_CACHE_KEY) != self._version
+            )
+            if stale:
+                self.build()
+
+    # Querying
+
+    def _matches(self, query_token):
+        """
+        Map indexed tokens matching a query token to a score factor:
+        exact/prefix matches first, then matches after spelling folding
+        and, for romanized tokens, after transliteration to Bengali or
+        through the English synonym table
+        """
+        matches = {}
+
+        def add(token, factor):
+            if factor > matches.get(token, 0):
+                matches[token] = factor
+
+        for token in _expand(self._vocabulary, query_token):
+            add(token, 1.0 if token == query_token else PREFIX_MATCH_FACTOR)
+
+        keys = [(fold(query_token), FOLDED_MATCH_FACTOR)]
+        if LATIN_TOKEN_RE.match(query_token):
+            keys.append((fold(transliterate(query_token)), TRANSLITERATED_MATCH_FACTOR))
+            for word, exact in romanized_synonyms(query_token).items():
+                factor = TRANSLITERATED_MATCH_FACTOR if exact else TRANSLITERATED_MATCH_FACTOR * PREFIX_MATCH_FACTOR
+                for token in tokenize(word):
+                    keys.append((fold(token), factor))
+        for key, key_factor in keys:
+            for folded in _expand(self._folded_vocabulary, key):
+                factor = key_factor if folded == key else key_factor * PREFIX_MATCH_FACTOR
+                for token in self._folded[folded]:
+                    add(token, factor)
+        return matches, [key for key, _ in keys]
+
+    def _similar(self, keys):
+        """Map indexed tokens similar (by trigrams) to any folded key to a score factor"""
+        matches = {}
+        for key in keys:
+            key_trigrams = trigrams(key)
+            shared = {}
+            for trigram in key_trigrams:
+                for folded in self._trigrams.get(trigram, ()):
+                    shared[folded] = shared.get(folded, 0) + 1
+            for folded, count in shared.items():
+                similarity = count / (len(key_trigrams) + len(trigrams(folded)) - count)
+                if similarity < TRIGRAM_THRESHOLD:
+                    continue
+                factor = similarity * TRIGRAM_MATCH_FACTOR
+                for token in self._folded[folded]:
+                    if factor > matches.get(token, 0):
+                        matches[token] = factor
+        return matches
+
+    def _score_matches(self, matches, allowed):
+        scores = {}
+        for token, factor in matches.items():
+            for pk, mask in self._postings[token].items():
+                score = self._mask_score(mask, allowed) * factor
+                if score > scores.get(pk, 0):
+                    scores[pk] = score
+        return scores
+
+    def _mask_score(self, mask, allowed):
+        return max(
+            (self.fields[field] for field, bit in self._field_bits.items() if mask & allowed & bit),
+            default=0,
+        )
+
+    def search(self, query, fields=None):
+        """
+        Return primary keys of active doctors matching every token of the
+        query, best match first
+        `fields` restricts matching to some of the indexed fields
+        """
+        query_tokens = list(dict.fromkeys(tokenize(query)))
+        if not query_tokens:
+            return []
+
+        allowed = 0
+        for field in (fields or self.fields):
+            allowed |= self._field_bits[field]
+
+        self._ensure_fresh()
+        with self._lock:
+            scores = None
+            for query_token in query_tokens:
+                matches, keys = self._matches(query_token)
+                token_scores = self._score_matches(matches, allowed)
+                if not token_scores and allowed & self._fuzzy_bits:
+                    # Nothing matched as typed: treat it as a misspelling
+                    token_scores = self._score_matches(
+                        self._similar(keys), allowed & self._fuzzy_bits
+                    )
+                if scores is None:
+                    scores = token_scores
+                else:
+                    scores = {
+                        pk: score + token_scores[pk]
+                        for pk, score in scores.items()
+                        if pk in token_scores
+                    }
+                if not scores:
+                    return []
+            order_keys = self._order_keys
+            return sorted(scores, key=lambda pk: (-scores[pk], order_keys[pk]))
+
+
+def _expand(vocabulary, token):
+    """Tokens of a sorted vocabulary equal to or starting with a token"""
+    position = bisect_left(vocabulary, token)
+    while position < len(vocabulary):
+        candidate = vocabulary[position]
+        if not candidate.startswith(token):
+            break
+        yield candidate
+        position += 1
+
+
+def _remove_sorted(vocabulary, token):
+    position = bisect_left(vocabulary, token)
+    if position < len(vocabulary) and vocabulary[position] == token:
+        del vocabulary[position]
+
+
+search_index = DoctorSearchIndex()
+
+
+def search_doctors(queryset, query, fields=None):
+    """
+    Primary keys of the doctors of `queryset` matching a search query,
+    ordered by relevance. The index already ranked them, so SQL only
+    filters (pk__in) and the order is kept in Python.
+    """
+    pks = search_index.search(query, fields)
+    if not pks:
+        return []
+    found = set(queryset.filter(pk__in=pks).values_list('pk', flat=True))
+    return [pk for pk in pks if pk in found]
+
+
+def results_generation():
+    return cache_generation(RESULTS_GENERATION_CACHE_KEY)
+
+
+def bump_results_generation():
+    """Invalidate every cached search result"""
+    bump_cache_generation(RESULTS_GENERATION_CACHE_KEY)
+
+
+def search_doctor_ids(queryset, query, fields=None):
+    """
+    Ordered primary keys of the doctors of `queryset` matching a search query,
+    served from the shared cache when the same search was run before
+
+    The key covers the normalized query tokens, the fields and the
+    queryset's WHERE clause (category / emergency filters), not the
+    selected columns or the page, so every page, language and listing
+    layout of a search shares one entry.
+    """
+    tokens = tokenize(query)
+    if not tokens:
+        return []
+    filters = str(queryset.values_list('pk').order_by().query)
+    digest = hashlib.md5(
+        '|'.join([' '.join(tokens), ','.join(fields or ()), filters]).encode('utf-8')
+    ).hexdigest()
+    cache_key = f'doctors:search_results:{results_generation()}:{digest}'
+
+    ids = cache.get(cache_key)
+    if ids is None:
+        ids = search_doctors(queryset, query, fields)
+        cache.set(cache_key, ids, RESULTS_CACHE_TIMEOUT)
+    return ids
@@ -0,0 +1,119 @@
+# -*- coding: utf-8 -*-
+"""
+Signal handlers for doctors app
+Keep the in-process search structures, the shared search results
+cache, the leave index, the page and fragment caches, the data version
+and the materialized availability timeline in sync with the database
+"""
+from django.db import transaction
+from django.db.models.signals import m2m_changed, post_delete, post_save
+from django.dispatch import receiver
+
+from .models import Category, Doctor, DoctorLeave, EmergencySchedule, Review
+from .availability import rebuild_timeline
+from .fragments import bump_fragment_generation
+from .leaves import bump_leave_index_version
+from .page_cache import bump_page_generation
+from .search import SEARCH_FIELDS, bump_results_generation, search_index
+from .versioning import mark_data_changed
+
+
+# Fields whose change requires the doctor to be re-indexed
+INDEXED_FIELDS = {'name', 'is_active', 'is_emergency_available', 'is_24_7_available'}
+for _field in SEARCH_FIELDS:
+    INDEXED_FIELDS.update([_field, f'{_field}_en'])
+
+# Doctor fields the availability timeline is built from
+TIMELINE_FIELDS = {'is_emergency_available', 'is_24_7_available'}
+
+
+@receiver(post_save, sender=Doctor)
+def reindex_doctor(sender, instance, update_fields=None, **kwargs):
+    """Re-index a doctor once the save is committed"""
+    # Saves like view_count updates don't touch the index
+    if update_fields is not None and not INDEXED_FIELDS.intersection(update_fields):
+        return
+    pk = instance.pk
+    transaction.on_commit(lambda: search_index.reindex_doctor(pk))
+    transaction.on_commit(bump_results_generation)
+
+
+@receiver(post_delete, sender=Doctor)
+def unindex_doctor(sender, instance, **kwargs):
+    """Remove a deleted doctor from the index"""
+    pk = instance.pk
+    transaction.on_commit(lambda: search_index.remove_doctor(pk))
+    transaction.on_commit(bump_results_generation)
+
+
+@receiver(post_save, sender=DoctorLeave)
+@receiver(post_delete, sender=DoctorLeave)
+def invalidate_leave_index(sender, **kwargs):
+    """Leave trees are rebuilt on next use (before the timeline below)"""
+    transaction.on_commit(bump_leave_index_version)
+
+
+@receiver(post_save, sender=Doctor)
+def rebuild_doctor_timeline(sender, instance, created=False, update_fields=None, raw=False, **kwargs):
+    """Emergency flags decide whether (and how) the doctor is on duty"""
+    # Fixtures (loaddata) may not have loaded the schedules and leaves yet -
+    # run refresh_availability_timeline afterwards
+    if raw:
+        return
+    if not created and update_fields is not None and not TIMELINE_FIELDS.intersection(update_fields):
+        return
+    pk = instance.pk
+    transaction.on_commit(lambda: rebuild_timeline([pk]))
+
+
+@receiver(post_save, sender=EmergencySchedule)
+@receiver(post_delete, sender=EmergencySchedule)
+@receiver(post_save, sender=DoctorLeave)
+@receiver(post_delete, sender=DoctorLeave)
+def rebuild_schedule_timeline(sender, instance, **kwargs):
+    """Rebuild the on-duty intervals of the doctor whose schedule or leave changed"""
+    if kwargs.get('raw'):
+        return
+    doctor_id = instance.doctor_id
+    transaction.on_commit(lambda: rebuild_timeline([doctor_id]))
+
+
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+@receiver(m2m_changed, sender=Doctor.categories.through)
+def invalidate_search_results(sender, **kwargs):
+    """Category changes and (un)assignments change category filtered results"""
+    if kwargs.get('action', 'post_').startswith('post_'):
+        transaction.on_commit(bump_results_generation)
+
+
+@receiver(post_save, sender=Doctor)
+@receiver(post_delete, sender=Doctor)
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+@receiver(m2m_changed, sender=Doctor.categories.through)
+@receiver(post_save, sender=Review)
+@receiver(post_delete, sender=Review)
+@receiver(post_save, sender=EmergencySchedule)
+@receiver(post_delete, sender=EmergencySchedule)
+@receiver(post_save, sender=DoctorLeave)
+@receiver(post_delete, sender=DoctorLeave)
+def invalidate_pages(sender, **kwargs):
+    """Anything shown on public pages changed - drop the cached pages and ETags"""
+    if kwargs.get('action', 'post_').startswith('post_'):
+        transaction.on_commit(bump_page_generation)
+        transaction.on_commit(mark_data_changed)
+
+
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+@receiver(m2m_changed, sender=Doctor.categories.through)
+@receiver(post_save, sender=EmergencySchedule)
+@receiver(post_delete, sender=EmergencySchedule)
+@receiver(post_save, sender=DoctorLeave)
+@receiver(post_delete, sender=DoctorLeave)
+def invalidate_fragments(sender, **kwargs):
+    """Card contents that don't bump Doctor.updated_at (category badge, availability)"""
+    if kwargs.get('action', 'post_').startswith('post_'):
+        transaction.on_commit(bump_fragment_generation)
+
@@ -0,0 +1,154 @@
+# -*- coding: utf-8 -*-
+"""
+Probabilistic data sketches for analytics
+
+HyperLogLog estimates the number of distinct items (visitors, search terms)
+in fixed memory and can be merged, so per-day sketches answer "unique
+visitors between two dates" without keeping raw IP addresses.
+SpaceSaving keeps the most frequent items (popular search terms) the same way.
+"""
+import hashlib
+import json
+import math
+import zlib
+
+
+class HyperLogLog:
+    """
+    HyperLogLog distinct counter (Flajolet et al.) over 64-bit hashes
+    Standard error is about 1.04 / sqrt(2 ** precision): ~1.6% at the default 12.
+    """
+
+    DEFAULT_PRECISION = 12
+
+    def __init__(self, precision=DEFAULT_PRECISION, registers=None):
+        if not 4 <= precision <= 16:
+            raise ValueError('HyperLogLog precision must be between 4 and 16')
+        self.precision = precision
+        self.size = 1 << precision
+        self.registers = bytearray(registers) if registers is not None else bytearray(self.size)
+        if len(self.registers) != self.size:
+            raise ValueError('HyperLogLog register count does not match precision')
+
+    @staticmethod
+    def hash(value):
+        if not isinstance(value, bytes):
+            value = str(value).encode('utf-8')
+        return int.from_bytes(hashlib.blake2b(value, digest_size=8).digest(), 'big')
+
+    def add(self, value):
+        """Add an item (anything with a stable str())"""
+        hashed = self.hash(value)
+        index = hashed >> (64 - self.precision)
+        remaining_bits = 64 - self.precision
+        rest = hashed & ((1 << remaining_bits) - 1)
+        # Position of the leftmost 1-bit in the remaining bits
+        rank = remaining_bits - rest.bit_length() + 1
+        if rank > self.registers[index]:
+            self.registers[index] = rank
+
+    def update(self, values):
+        for value in values:
+            self.add(value)
+
+    def merge(self, other):
+        """Union with another sketch of the same precision (in place)"""
+        if other.precision != self.precision:
+            raise ValueError('Cannot merge HyperLogLog sketches of different precision')
+        self.registers = bytearray(map(max, self.registers, other.registers))
+        return self
+
+    def count(self):
+        """Estimated number of distinct items added"""
+        size = self.size
+        alpha = 0.7213 / (1 + 1.079 / size)
+        estimate = alpha * size * size / sum(2.0 ** -register for register in self.registers)
+        zeros = self.registers.count(0)
+        if estimate <= 2.5 * size and zeros:
+            # Small range correction - linear counting
+            estimate = size * math.log(size / zeros)
+        return int(round(estimate))
+
+    def __len__(self):
+        return self.count()
+
+    def is_empty(self):
+        return not any(self.registers)
+
+    def to_bytes(self):
+        """Compact serialized form: precision byte + zlib-compressed registers"""
+        return bytes([self.precision]) + zlib.compress(bytes(self.registers))
+
+    @classmethod
+    def from_bytes(cls, data):
+        data = bytes(data)
+        return cls(precision=data[0], registers=zlib.decompress(data[1:]))
+
+
+class SpaceSaving:
+    """
+    Space-Saving heavy hitters (Metwally et al.) - approximate top-K in fixed memory
+    Keeps at most `capacity` counters; an unseen item replaces the smallest
+    counter and inherits its count as overestimation `error`. Any item seen
+    more than total / capacity times is guaranteed to be tracked.
+    """
+
+    DEFAULT_CAPACITY = 200
+
+    def __init__(self, capacity=DEFAULT_CAPACITY, counters=None):
+        self.capacity = capacity
+        # item -> [count, error]
+        self.counters = dict(counters or {})
+
+    def add(self, item, count=1):
+        counter = self.counters.get(item)
+        if counter is not None:
+            counter[0] += count
+        elif len(self.counters) < self.capacity:
+            self.counters[item] = [count, 0]
+        else:
+            smallest = min(self.counters, key=lambda key: self.counters[key][0])
+            floor = self.counters.pop(smallest)[0]
+            self.counters[item] = [floor + count, floor]
+
+    def update(self, items):
+        for item in items:
+            self.add(item)
+
+    def merge(self, other):
+        """Combine with another summary (in place), keeping the `capacity` largest counters"""
+        combined = {item: list(counter) for item, counter in self.counters.items()}
+        for item, (count, error) in other.counters.items():
+            if item in combined:
+                combined[item][0] += count
+                combined[item][1] += error
+            else:
+                combined[item] = [count, error]
+        capacity = max(self.capacity, other.capacity)
+        top = sorted(combined.items(), key=lambda entry: (-entry[1][0], entry[0]))[:capacity]
+        self.capacity = capacity
+        self.counters = dict(top)
+        return self
+
+    def top(self, limit=10):
+        """[(item, estimated count)] of the most frequent items"""
+        ranked = sorted(self.counters.items(), key=lambda entry: (-entry[1][0], entry[0]))
+        return [(item, count) for item, (count, _) in ranked[:limit]]
+
+    def __len__(self):
+        return len(self.counters)
+
+    def is_empty(self):
+        return not self.counters
+
+    def to_bytes(self):
+        payload = {'capacity': self.capacity, 'counters': [[item, count, error] for item, (count, error) in self.counters.items()]}
+        return zlib.compress(json.dumps(payload, ensure_ascii=False).encode('utf-8'))
+
+    @classmethod
+    def from_bytes(cls, data):
+        payload = json.loads(zlib.decompress(bytes(data)).decode('utf-8'))
+        return cls(
+            capacity=payload['capacity'],
+            counters={item: [count, error] for item, count, error in payload['counters']},
+        )
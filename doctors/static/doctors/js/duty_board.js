@@ -0,0 +1,89 @@
+// Live emergency duty board - keeps the "available now" badges current
+// from the Server-Sent Events stream instead of reloading the page
+
+document.addEventListener('DOMContentLoaded', function() {
+    const contentArea = document.querySelector('[data-live-url]');
+    if (!contentArea || !window.EventSource) {
+        return;
+    }
+
+    // Milliseconds before opening a new stream after an error response
+    const RECONNECT_DELAY = 15000;
+
+    // Doctors available right now (ids), null until the first snapshot
+    let available = null;
+
+    // Lists filtered or ordered by availability have to be fetched again
+    function listDependsOnAvailability() {
+        const params = new URLSearchParams(window.location.search);
+        return params.get('filter') === 'now' || params.get('sort') === 'available';
+    }
+
+    function updateBadges() {
+        contentArea.querySelectorAll('[data-doctor-id]').forEach(function(card) {
+            const badge = card.querySelector('[data-available-badge]');
+            if (badge) {
+                badge.classList.toggle('d-none', !available.has(Number(card.dataset.doctorId)));
+            }
+        });
+    }
+
+    function reloadResults() {
+        fetch(window.location.href, {
+            headers: {
+                'X-Requested-With': 'XMLHttpRequest'
+            }
+        })
+        .then(response => response.ok ? response.text() : Promise.reject(response.status))
+        .then(html => {
+            contentArea.innerHTML = html;
+            updateBadges();
+        })
+        .catch(error => console.error('Duty board reload failed:', error));
+    }
+
+    function changed() {
+        if (listDependsOnAvailability()) {
+            reloadResults();
+        } else {
+            updateBadges();
+        }
+    }
+
+    // EventSource reconnects by itself after a dropped stream, but gives up
+    // after an error response (503 while the server is busy) - start over
+    function connect() {
+        const source = new EventSource(contentArea.dataset.liveUrl);
+        source.addEventListener('snapshot', onSnapshot);
+        source.addEventListener('diff', onDiff);
+        source.addEventListener('error', function() {
+            if (source.readyState === EventSource.CLOSED) {
+                setTimeout(connect, RECONNECT_DELAY);
+            }
+        });
+    }
+
+    // Sent on every (re)connect
+    function onSnapshot(event) {
+        const previous = available;
+        available = new Set(JSON.parse(event.data).available);
+        if (previous === null) {
+            updateBadges();
+        } else if (previous.size !== available.size || [...previous].some(pk => !available.has(pk))) {
+            changed();
+        }
+    }
+
+    // Doctors coming on ("on") or going off ("off") duty
+    function onDiff(event) {
+        if (available === null) {
+            return;
+        }
+        const diff = JSON.parse(event.data);
+        diff.on.forEach(pk => available.add(pk));
+        diff.off.forEach(pk => available.delete(pk));
+        changed();
+    }
+
+    connect();
+});
@@ -8,8 +8,8 @@ document.addEventListener('DOMContentLoaded', function() {
     // Get category buttons
     const categoryButtons = document.querySelectorAll('.category-filter a');
     
-    // Get main content area
-    const contentArea = document.querySelector('.row');
+    // Get main content area (pages without one fall back to normal links)
+    const contentArea = document.querySelector('[data-results]');
     const loadingOverlay = document.getElementById('loadingOverlay');
     
     // Debounce function for search
@@ -42,32 +42,9 @@ document.addEventListener('DOMContentLoaded', function() {
         })
         .then(response => response.text())
         .then(html => {
-            // Parse the HTML response
-            const parser = new DOMParser();
-            const doc = parser.parseFromString(html, 'text/html');
-            
-            // Get the new content
-            const newContent = doc.querySelector('.row');
-            const newPagination = doc.querySelector('.pagination');
-            const newAlert = doc.querySelector('.alert-info');
-            
-            // Update content
-            if (contentArea && newContent) {
-                contentArea.innerHTML = newContent.innerHTML;
-            }
-            
-            // Update pagination if exists
-            const oldPagination = document.querySelector('.pagination');
-            if (oldPagination && newPagination) {
-                oldPagination.parentElement.innerHTML = newPagination.parentElement.innerHTML;
-            } else if (oldPagination && !newPagination) {
-                oldPagination.parentElement.remove();
-            }
-            
-            // Update alert info
-            const oldAlert = document.querySelector('.alert-info');
-            if (oldAlert && newAlert) {
-                oldAlert.innerHTML = newAlert.innerHTML;
+            // The server answers AJAX requests with just the results fragment
+            if (contentArea) {
+                contentArea.innerHTML = html;
             }
             
             // Update URL without reload
@@ -106,27 +83,136 @@ document.addEventListener('DOMContentLoaded', function() {
                 currentUrl.searchParams.delete('search');
             }
             
-            // Reset to page 1 when searching
+            // Start from the first page when searching
             currentUrl.searchParams.delete('page');
+            currentUrl.searchParams.delete('cursor');
             
             performFilter(currentUrl.toString());
         }
         
-        // Debounced search for input typing
-        const debouncedSearch = debounce(performSearch, 500);
-        searchInput.addEventListener('input', debouncedSearch);
-        
-        // Handle form submission (search button click)
-        if (searchForm) {
+        // Handle form submission (search button click / Enter)
+        if (searchForm && contentArea) {
             searchForm.addEventListener('submit', function(e) {
                 e.preventDefault();
+                hideSuggestions();
                 performSearch(); // Trigger search immediately on button click
             });
         }
     }
     
+    // As-you-type suggestions from the JSON endpoint - no page re-render per keystroke
+    const suggestUrl = searchInput ? searchInput.dataset.suggestUrl : null;
+    const suggestIcons = {
+        doctor: 'fa-user-md',
+        specialty: 'fa-stethoscope',
+        hospital: 'fa-hospital',
+        category: 'fa-tags'
+    };
+    let suggestBox = null;
+    let activeIndex = -1;
+    let suggestController = null;
+    
+    function hideSuggestions() {
+        if (suggestBox) {
+            suggestBox.innerHTML = '';
+            suggestBox.classList.remove('active');
+        }
+        activeIndex = -1;
+    }
+    
+    function highlightSuggestion(index) {
+        const items = suggestBox.querySelectorAll('a');
+        items.forEach(item => item.classList.remove('active'));
+        if (index >= 0 && index < items.length) {
+            items[index].classList.add('active');
+        }
+        activeIndex = index;
+    }
+    
+    function renderSuggestions(suggestions) {
+        hideSuggestions();
+        suggestions.forEach(suggestion => {
+            const item = document.createElement('a');
+            item.href = suggestion.url;
+            item.className = 'list-group-item list-group-item-action';
+            const icon = document.createElement('i');
+            icon.className = 'fas ' + (suggestIcons[suggestion.type] || 'fa-search') + ' me-2 text-muted';
+            item.appendChild(icon);
+            item.appendChild(document.createTextNode(suggestion.label));
+            suggestBox.appendChild(item);
+        });
+        if (suggestions.length) {
+            suggestBox.classList.add('active');
+        }
+    }
+    
+    function fetchSuggestions() {
+        const query = searchInput.value.trim();
+        if (!query) {
+            hideSuggestions();
+            return;
+        }
+        // Only the latest keystroke's answer matters
+        if (suggestController) {
+            suggestController.abort();
+        }
+        suggestController = new AbortController();
+        
+        fetch(suggestUrl + '?' + new URLSearchParams({ q: query }), {
+            signal: suggestController.signal
+        })
+        .then(response => response.json())
+        .then(data => {
+            if (searchInput.value.trim() === query) {
+                renderSuggestions(data.suggestions);
+            }
+        })
+        .catch(error => {
+            if (error.name !== 'AbortError') {
+                console.error('Suggest error:', error);
+            }
+        });
+    }
+    
+    if (searchInput && suggestUrl) {
+        suggestBox = document.createElement('div');
+        suggestBox.className = 'suggest-list list-group';
+        searchInput.parentElement.classList.add('suggest-wrapper');
+        searchInput.parentElement.appendChild(suggestBox);
+        
+        searchInput.addEventListener('input', debounce(fetchSuggestions, 150));
+        
+        // Keyboard navigation
+        searchInput.addEventListener('keydown', function(e) {
+            const items = suggestBox.querySelectorAll('a');
+            if (!items.length) {
+                return;
+            }
+            if (e.key === 'ArrowDown') {
+                e.preventDefault();
+                highlightSuggestion((activeIndex + 1) % items.length);
+            } else if (e.key === 'ArrowUp') {
+                e.preventDefault();
+                highlightSuggestion(activeIndex <= 0 ? items.length - 1 : activeIndex - 1);
+            } else if (e.key === 'Enter' && activeIndex >= 0) {
+                e.preventDefault();
+                window.location.href = items[activeIndex].href;
+            } else if (e.key === 'Escape') {
+                hideSuggestions();
+            }
+        });
+        
+        // Let a click on a suggestion land before hiding the list
+        searchInput.addEventListener('blur', function() {
+            setTimeout(hideSuggestions, 200);
+        });
+    }
+    
     // Handle category buttons
     categoryButtons.forEach(button => {
+        if (!contentArea) {
+            return;
+        }
         button.addEventListener('click', function(e) {
             e.preventDefault();
             const url = this.getAttribute('href');
@@ -140,6 +226,9 @@ document.addEventListener('DOMContentLoaded', function() {
     
     // Handle pagination
     function attachPaginationListeners() {
+        if (!contentArea) {
+            return;
+        }
         const paginationLinks = document.querySelectorAll('.pagination a');
         paginationLinks.forEach(link => {
             link.addEventListener('click', function(e) {
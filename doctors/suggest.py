@@ -0,0 +1,159 @@
+# -*- coding: utf-8 -*-
+"""
+Typeahead suggestions for the search box
+
+A prefix trie over doctor names, specialties, hospitals and category
+names in both languages. Entries are inserted best first (by view count)
+and every node keeps only the first MAX_SUGGESTIONS entries that pass
+through it, so answering a prefix is a single walk down the trie.
+Romanized prefixes ("ga", "gyne") also walk their Bengali spellings.
+"""
+import html
+import threading
+import time
+from collections import defaultdict, namedtuple
+
+from django.db.models import Sum
+
+from .search import (
+    INDEX_MAX_AGE,
+    LATIN_TOKEN_RE,
+    fold,
+    results_generation,
+    romanized_synonyms,
+    tokenize,
+    transliterate,
+)
+
+
+MAX_SUGGESTIONS = 10
+
+# Only the first characters of a label are indexed - nobody types more
+# before picking a suggestion, and it keeps the trie small
+MAX_KEY_LENGTH = 24
+
+# How often (seconds) a worker asks the shared cache whether the data
+# changed; lookups in between never leave the process
+FRESHNESS_CHECK_INTERVAL = 5
+
+Suggestion = namedtuple('Suggestion', ['label', 'kind', 'target', 'weight'])
+
+# Equal view counts: doctors first, then categories, specialties, hospitals
+KIND_ORDER = {'doctor': 0, 'category': 1, 'specialty': 2, 'hospital': 3}
+
+
+def _key(text):
+    return ' '.join(fold(token) for token in tokenize(text))
+
+
+def _lookup_keys(prefix):
+    """Trie keys of a typed prefix: as typed, transliterated, and with the last word's synonyms"""
+    tokens = tokenize(prefix)
+    keys = [' '.join(fold(token) for token in tokens)]
+    if not any(LATIN_TOKEN_RE.match(token) for token in tokens):
+        return keys
+    bengali = [fold(transliterate(token)) if LATIN_TOKEN_RE.match(token) else fold(token) for token in tokens]
+    keys.append(' '.join(bengali))
+    if LATIN_TOKEN_RE.match(tokens[-1]):
+        for word in romanized_synonyms(tokens[-1]):
+            keys.append(' '.join(bengali[:-1] + [_key(word)]))
+    return keys
+
+
+class SuggestionTrie:
+    """Prefix trie of Suggestions; a node is [children, best entries]"""
+
+    def __init__(self):
+        self._root = [{}, []]
+        self._lock = threading.Lock()
+        self._generation = None
+        self._built_at = 0
+        self._checked_at = 0
+
+    def _load_entries(self):
+        from .models import Category, Doctor
+
+        entries = []
+        specialties = defaultdict(int)
+        hospitals = {}
+        doctors = Doctor.objects.filter(is_active=True).only(
+            'name', 'name_en', 'hospital', 'clean_hospital', 'clean_specialty', 'clean_specialty_en', 'view_count'
+        )
+        for doctor in doctors:
+            for name in (doctor.name, doctor.name_en):
+                if name:
+                    entries.append(Suggestion(name, 'doctor', doctor.pk, doctor.view_count))
+            for specialty in (doctor.clean_specialty, doctor.clean_specialty_en):
+                if specialty:
+                    specialties[specialty] += doctor.view_count
+            if doctor.hospital:
+                label, weight = hospitals.get(doctor.hospital, (doctor.clean_hospital or doctor.hospital, 0))
+                hospitals[doctor.hospital] = (label, weight + doctor.view_count)
+
+        entries += [Suggestion(label, 'specialty', label, weight) for label, weight in specialties.items()]
+        entries += [Suggestion(label, 'hospital', hospital, weight) for hospital, (label, weight) in hospitals.items()]
+
+        categories = Category.objects.filter(is_active=True).annotate(views=Sum('doctors__view_count'))
+        for category in categories:
+            for name in (category.name, category.name_english):
+                if name:
+                    entries.append(Suggestion(name, 'category', category.slug, category.views or 0))
+        # Some imported texts still carry HTML entities (&amp;)
+        return [entry._replace(label=html.unescape(entry.label)) for entry in entries]
+
+    def build(self):
+        generation = results_generation()
+        entries = sorted(self._load_entries(), key=lambda entry: (-entry.weight, KIND_ORDER[entry.kind], entry.label))
+        root = [{}, []]
+        for entry in entries:
+            words = _key(entry.label).split(' ')
+            # Every word start is a key, so "rahman" finds "Abdur Rahman"
+            for position in range(len(words)):
+                key = ' '.join(words[position:])[:MAX_KEY_LENGTH]
+                node = root
+                for char in key:
+                    node = node[0].setdefault(char, [{}, []])
+                    best = node[1]
+                    if len(best) < MAX_SUGGESTIONS and entry not in best:
+                        best.append(entry)
+        self._root = root
+        self._generation = generation
+        self._built_at = self._checked_at = time.monotonic()
+
+    def _ensure_fresh(self):
+        """Build the trie on first use and rebuild it when the data changed"""
+        if self._built_at and time.monotonic() - self._checked_at < FRESHNESS_CHECK_INTERVAL:
+            return
+        with self._lock:
+            now = time.monotonic()
+            if self._built_at and now - self._checked_at < FRESHNESS_CHECK_INTERVAL:
+                return  # another thread just checked
+            self._checked_at = now
+            if (
+                not self._built_at
+                or now - self._built_at > INDEX_MAX_AGE
+                or results_generation() != self._generation
+            ):
+                self.build()
+
+    def lookup(self, prefix, limit=MAX_SUGGESTIONS):
+        """Best Suggestions whose label (or a word of it) starts with `prefix`"""
+        keys = [key[:MAX_KEY_LENGTH] for key in _lookup_keys(prefix)]
+        if not keys[0]:
+            return []
+        self._ensure_fresh()
+        found = []
+        for key in dict.fromkeys(keys):
+            node = self._root
+            for char in key:
+                node = node[0].get(char)
+                if node is None:
+                    break
+            else:
+                found += [entry for entry in node[1] if entry not in found]
+        if len(keys) > 1:
+            found.sort(key=lambda entry: (-entry.weight, KIND_ORDER[entry.kind], entry.label))
+        return found[:limit]
+
+
+suggestion_trie = SuggestionTrie()
@@ -0,0 +1,12 @@
+# -*- coding: utf-8 -*-
+from django import template
+
+from doctors.fragments import render_doctor_fragments
+
+register = template.Library()
+
+
+@register.simple_tag
+def doctor_fragments(doctors, variant):
+    """Cached rendered markup of each doctor: {% doctor_fragments doctors 'card' as cards %}"""
+    return render_doctor_fragments(doctors, variant)
@@ -1,3 +1,513 @@
-from django.test import TestCase
+import asyncio
+import random
+import time
+from datetime import date, datetime, time as clock, timedelta
+from unittest import mock
 
-# Create your tests here.
+from django.core.cache import cache
+from django.db import connection
+from django.db.models import Q
+from django.test import RequestFactory, SimpleTestCase, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from . import live
+from .analytics import aggregate_daily_stats, compact_day, day_range
+from .availability import TIMELINE_DAYS, AvailabilityIndex, build_intervals, ensure_timeline, rebuild_timeline
+from .leaves import IntervalTree, LeaveSpan
+from .models import AvailabilityInterval, Doctor, EmergencySchedule, SearchQuery, SearchQueryDaily
+from .pagination import CURSOR_PARAM, DOCTOR_ORDERING, paginate, paginate_ids
+from .search import fold, search_doctors, search_index, tokenize, transliterate
+from .sketches import HyperLogLog, SpaceSaving
+from .suggest import suggestion_trie
+from .tracking import EventBuffer
+
+
+# Tests must not touch the shared (file/database) cache of the dev server
+LOCMEM_CACHES = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}
+
+# Pages render without a collectstatic manifest
+PLAIN_STATICFILES = 'django.contrib.staticfiles.storage.StaticFilesStorage'
+
+
+def make_doctor(name, specialty='মেডিসিন বিশেষজ্ঞ', **fields):
+    fields.setdefault('qualification', 'এমবিবিএস')
+    fields.setdefault('schedule', 'প্রতিদিন বিকাল ৪টা - রাত ৯টা')
+    fields.setdefault('hospital', 'টাঙ্গাইল জেনারেল হাসপাতাল')
+    fields.setdefault('contact', '01700000000')
+    return Doctor.objects.create(name=name, specialty=specialty, **fields)
+
+
+class TextFoldingTests(SimpleTestCase):
+    """Spelling variants fold to one key; romanized words become Bengali"""
+
+    def test_fold_spelling_variants(self):
+        for first, second in (('গাইনী', 'গাইনি'), ('সারজন', 'সার্জন'), ('পড়া', 'পরা'), ('রোগ', 'রোগ')):
+            with self.subTest(word=first):
+                self.assertEqual(fold(first), fold(second))
+        self.assertNotEqual(fold('শিশু'), fold('হাড়'))
+
+    def test_tokenize(self):
+        self.assertEqual(tokenize('গাইনি<br>ও প্রসূতি'), ['গাইনি', 'ও', 'প্রসূতি'])
+        self.assertEqual(tokenize('Dr. KARIM'), ['dr', 'karim'])
+        self.assertEqual(tokenize(''), [])
+
+    def test_transliterate(self):
+        for latin, bengali in (('sarjon', 'সার্জন'), ('gaini', 'গাইনি'), ('medisin', 'মেডিসিন'), ('shishu', 'শিশু')):
+            with self.subTest(word=latin):
+                self.assertEqual(transliterate(latin), bengali)
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class SearchParityTests(TestCase):
+    """The index finds everything the old icontains filters found at a word start"""
+
+    @classmethod
+    def setUpTestData(cls):
+        make_doctor('ডা. রহিমা খাতুন', 'গাইনি ও প্রসূতি বিশেষজ্ঞ', qualification='এমবিবিএস, এফসিপিএস (গাইনী)')
+        make_doctor('ডা. করিম উদ্দিন', 'মেডিসিন বিশেষজ্ঞ', hospital='কুমুদিনী হাসপাতাল')
+        make_doctor('ডা. জামাল হোসেন', 'জেনারেল সার্জন', qualification='এমবিবিএস, এমএস (সার্জারি)')
+        make_doctor('ডা. নাসরিন আক্তার', 'শিশু রোগ বিশেষজ্ঞ', hospital='শিশু হাসপাতাল, টাঙ্গাইল')
+        make_doctor('Dr. Abdur Rahman', 'Medicine Specialist', hospital='Tangail Clinic')
+        make_doctor('ডা. বন্ধ', 'মেডিসিন বিশেষজ্ঞ', is_active=False)
+
+    def setUp(self):
+        search_index.build()
+
+    def test_word_queries_match_icontains(self):
+        doctors = Doctor.objects.filter(is_active=True)
+        words = {}
+        for doctor in doctors:
+            words[doctor.pk] = [
+                token for field in ('name', 'specialty', 'hospital', 'qualification')
+                for token in tokenize(getattr(doctor, field))
+            ]
+        queries = {token for tokens in words.values() for token in tokens}
+        queries.update(token[:3] for token in list(queries) if len(token) > 3)
+        for query in sorted(queries):
+            old = doctors.filter(
+                Q(name__icontains=query) | Q(specialty__icontains=query) |
+                Q(hospital__icontains=query) | Q(qualification__icontains=query)
+            ).values_list('pk', flat=True)
+            # Substring hits inside a word ("ডিসিন") are not word matches
+            expected = {pk for pk in old if any(word.startswith(query) for word in words[pk])}
+            with self.subTest(query=query):
+                self.assertLessEqual(expected, set(search_index.search(query)))
+
+    def test_ranked_ids_filtered_in_sql(self):
+        queryset = Doctor.objects.filter(is_active=True).exclude(hospital='কুমুদিনী হাসপাতাল')
+        allowed = set(queryset.values_list('pk', flat=True))
+        with CaptureQueriesContext(connection) as queries:
+            ids = search_doctors(queryset, 'ডা')
+        self.assertEqual(ids, [pk for pk in search_index.search('ডা') if pk in allowed])
+        self.assertEqual(len(ids), 3)
+        self.assertEqual(len(queries), 1)
+        self.assertNotIn('CASE', queries[0]['sql'])
+
+    def test_inactive_doctors_are_not_found(self):
+        self.assertNotIn('ডা. বন্ধ', Doctor.objects.filter(pk__in=search_index.search('বন্ধ')).values_list('name', flat=True))
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class CursorPaginationTests(TestCase):
+    """Walking the cursors forward and back visits every row once, in order"""
+
+    @classmethod
+    def setUpTestData(cls):
+        for number in range(47):
+            make_doctor(
+                f'ডা. {number:02d}',
+                is_emergency_available=number % 3 == 0,
+                is_24_7_available=number % 7 == 0,
+            )
+
+    def request(self, **params):
+        return RequestFactory().get('/', params)
+
+    def walk(self, first_page, turn):
+        """Pages from `first_page` following `turn(page)` cursors until there is none"""
+        pages = [first_page]
+        while turn(pages[-1]):
+            pages.append(paginate(self.request(**{CURSOR_PARAM: turn(pages[-1])}), Doctor.objects.all(), per_page=10))
+        return pages
+
+    def test_forward_and_back(self):
+        expected = list(Doctor.objects.order_by(*DOCTOR_ORDERING).values_list('pk', flat=True))
+        forward = self.walk(paginate(self.request(), Doctor.objects.all(), per_page=10), lambda page: page.next_cursor)
+        self.assertEqual([doctor.pk for page in forward for doctor in page], expected)
+        self.assertEqual([len(page) for page in forward], [10, 10, 10, 10, 7])
+        self.assertFalse(forward[0].has_previous)
+        self.assertFalse(forward[-1].has_next)
+
+        backward = self.walk(forward[-1], lambda page: page.previous_cursor)
+        self.assertEqual(
+            [[doctor.pk for doctor in page] for page in reversed(backward)],
+            [[doctor.pk for doctor in page] for page in forward],
+        )
+
+    def test_legacy_page_number(self):
+        expected = list(Doctor.objects.order_by(*DOCTOR_ORDERING).values_list('pk', flat=True))
+        page = paginate(self.request(page='3'), Doctor.objects.all(), per_page=10)
+        self.assertEqual([doctor.pk for doctor in page], expected[20:30])
+        page = paginate(self.request(page='99'), Doctor.objects.all(), per_page=10)
+        self.assertEqual([doctor.pk for doctor in page], expected[40:])
+
+    def test_id_list_forward_and_back(self):
+        ids = list(Doctor.objects.order_by('-pk').values_list('pk', flat=True))
+        pages = [paginate_ids(self.request(), Doctor.objects.all(), ids, per_page=10)]
+        while pages[-1].next_cursor:
+            pages.append(paginate_ids(self.request(cursor=pages[-1].next_cursor), Doctor.objects.all(), ids, per_page=10))
+        self.assertEqual([doctor.pk for page in pages for doctor in page], ids)
+        previous = paginate_ids(self.request(cursor=pages[-1].previous_cursor), Doctor.objects.all(), ids, per_page=10)
+        self.assertEqual([doctor.pk for doctor in previous], [doctor.pk for doctor in pages[-2]])
+
+    def test_tampered_cursor_opens_first_page(self):
+        page = paginate(self.request(cursor='junk'), Doctor.objects.all(), per_page=10)
+        self.assertFalse(page.has_previous)
+        self.assertEqual(len(page), 10)
+
+
+class SketchTests(SimpleTestCase):
+    """HyperLogLog and Space-Saving stay within their error bounds"""
+
+    def test_hyperloglog_error(self):
+        for count in (10, 1000, 50000):
+            sketch = HyperLogLog()
+            sketch.update(f'visitor-{number}' for number in range(count))
+            with self.subTest(count=count):
+                # ~1.6% standard error at precision 12 - allow 4 sigma
+                self.assertLessEqual(abs(sketch.count() - count), max(1, 0.065 * count))
+
+    def test_hyperloglog_merge_and_bytes(self):
+        first, second = HyperLogLog(), HyperLogLog()
+        first.update(range(0, 3000))
+        second.update(range(2000, 5000))
+        union = HyperLogLog.from_bytes(first.to_bytes()).merge(second)
+        self.assertLessEqual(abs(union.count() - 5000), 0.065 * 5000)
+        self.assertEqual(first.count(), HyperLogLog.from_bytes(first.to_bytes()).count())
+        with self.assertRaises(ValueError):
+            first.merge(HyperLogLog(precision=10))
+
+    def test_space_saving_bounds(self):
+        rng = random.Random(7)
+        stream = ['heavy-a'] * 400 + ['heavy-b'] * 250 + [f'rare-{rng.randrange(2000)}' for _ in range(3000)]
+        rng.shuffle(stream)
+        sketch = SpaceSaving(capacity=50)
+        sketch.update(stream)
+        truth = {item: stream.count(item) for item in set(stream)}
+
+        self.assertEqual([item for item, _ in sketch.top(2)], ['heavy-a', 'heavy-b'])
+        for item, (count, error) in sketch.counters.items():
+            with self.subTest(item=item):
+                self.assertLessEqual(count - error, truth[item])
+                self.assertGreaterEqual(count, truth[item])
+        # Anything seen more than total / capacity times is tracked
+        for item, count in truth.items():
+            if count > len(stream) / sketch.capacity:
+                self.assertIn(item, sketch.counters)
+
+    def test_space_saving_merge(self):
+        first, second = SpaceSaving(capacity=10), SpaceSaving(capacity=10)
+        first.update(['জ্বর'] * 5 + ['গাইনি'] * 2)
+        second.update(['গাইনি'] * 4)
+        merged = SpaceSaving.from_bytes(first.to_bytes()).merge(second)
+        self.assertEqual(merged.top(), [('গাইনি', 6), ('জ্বর', 5)])
+
+
+class IntervalTreeTests(SimpleTestCase):
+    """Interval tree answers match a brute-force scan"""
+
+    def test_matches_brute_force(self):
+        rng = random.Random(11)
+        items = []
+        for value in range(300):
+            start = rng.randrange(365)
+            items.append((start, start + rng.randrange(30), value))
+        tree = IntervalTree(items)
+        ordered = sorted(items, key=lambda item: (item[0], item[1]))
+        for _ in range(200):
+            start = rng.randrange(-10, 400)
+            end = start + rng.randrange(20)
+            expected = [value for item_start, item_end, value in ordered if item_start <= end and item_end >= start]
+            self.assertEqual(tree.overlapping(start, end), expected)
+        self.assertEqual(tree.at(400), [])
+        self.assertEqual(IntervalTree([]).overlapping(0, 10), [])
+
+    def test_dates_and_bounds_are_inclusive(self):
+        leave = LeaveSpan(1, 5, date(2026, 3, 2), date(2026, 3, 4), False)
+        tree = IntervalTree([(leave.start_date, leave.end_date, leave)])
+        self.assertEqual(tree.at(date(2026, 3, 4)), [leave])
+        self.assertEqual(tree.at(date(2026, 3, 5)), [])
+        self.assertEqual(tree.overlapping(date(2026, 2, 1), date(2026, 3, 2)), [leave])
+
+
+class AvailabilityIntervalTests(SimpleTestCase):
+    """Materialized intervals follow the weekly schedule, the flags and the leaves"""
+
+    MONDAY = date(2026, 3, 2)
+
+    def build(self, doctors, schedules=(), leaves=()):
+        return build_intervals(doctors, schedules, leaves, self.MONDAY)
+
+    def test_schedule_flags_and_leaves(self):
+        doctors = [
+            (1, False, True),   # emergency, Monday and Wednesday evenings
+            (2, True, False),   # 24/7
+            (3, False, False),  # not on emergency duty
+        ]
+        schedules = [
+            (1, 0, clock(18), clock(22)),
+            (1, 2, clock(18), clock(22)),
+            (3, 0, clock(9), clock(12)),
+        ]
+        leaves = [
+            # Away on Wednesday; the 24/7 doctor is away but still on call on Tuesday
+            LeaveSpan(10, 1, self.MONDAY + timedelta(days=2), self.MONDAY + timedelta(days=2), False),
+            LeaveSpan(11, 2, self.MONDAY + timedelta(days=1), self.MONDAY + timedelta(days=1), True),
+        ]
+        intervals = self.build(doctors, schedules, leaves)
+
+        first = [(start, end) for doctor_id, start, end in intervals if doctor_id == 1]
+        self.assertEqual(first, [
+            (datetime.combine(self.MONDAY, clock(18)), datetime.combine(self.MONDAY, clock(22))),
+            (datetime(2026, 3, 9, 18), datetime(2026, 3, 9, 22)),
+        ])
+        self.assertEqual(len([1 for doctor_id, _, _ in intervals if doctor_id == 2]), TIMELINE_DAYS)
+        self.assertFalse([1 for doctor_id, _, _ in intervals if doctor_id == 3])
+
+    def test_index_answers(self):
+        intervals = self.build([(1, False, True), (2, True, False)], [(1, 0, clock(18), clock(22))])
+        now = datetime.combine(self.MONDAY, clock(19))
+        index = AvailabilityIndex(intervals, now)
+        emergency, always = Doctor(pk=1), Doctor(pk=2, is_24_7_available=True)
+
+        self.assertTrue(index.is_available_now(emergency, now))
+        self.assertTrue(index.is_available_now(always, now))
+        self.assertFalse(index.is_available_now(emergency, now.replace(hour=23)))
+        self.assertEqual(index.next_available_time(emergency, now.replace(hour=10)), 'আজ 18:00 এ')
+        self.assertEqual(index.next_available_time(emergency, now.replace(hour=23)), 'সোমবার 18:00 এ')
+        self.assertEqual(index.next_available_time(Doctor(pk=3), now), 'সময়সূচী নেই')
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class RomanizedSearchTests(TestCase):
+    """Latin / English queries find the Bengali specialties"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.gyne = make_doctor('ডা. রহিমা খাতুন', 'গাইনি ও প্রসূতি বিশেষজ্ঞ')
+        cls.gyne_long_i = make_doctor('ডা. সালমা বেগম', 'গাইনী বিশেষজ্ঞ')
+        cls.medicine = make_doctor('ডা. করিম উদ্দিন', 'মেডিসিন বিশেষজ্ঞ')
+        cls.surgeon = make_doctor('ডা. জামাল হোসেন', 'জেনারেল সার্জন')
+
+    def setUp(self):
+        search_index.build()
+
+    def test_phonetic_transliteration(self):
+        self.assertEqual(transliterate('gaini'), 'গাইনি')
+        self.assertEqual(set(search_index.search('gaini')), {self.gyne.pk, self.gyne_long_i.pk})
+
+    def test_english_synonyms(self):
+        expected = {self.gyne.pk, self.gyne_long_i.pk}
+        for query in ('gyne', 'gynae', 'Gynecology', 'gyn'):
+            with self.subTest(query=query):
+                self.assertEqual(set(search_index.search(query)), expected)
+        self.assertEqual(search_index.search('medicine'), [self.medicine.pk])
+        self.assertEqual(search_index.search('surgeon'), [self.surgeon.pk])
+
+    def test_synonym_matches_bengali_query(self):
+        for latin, bengali in (('medicine', 'মেডিসিন'), ('gyne', 'গাইনি')):
+            with self.subTest(query=latin):
+                self.assertEqual(set(search_index.search(latin)), set(search_index.search(bengali)))
+
+
+@override_settings(CACHES=LOCMEM_CACHES, SECURE_SSL_REDIRECT=False)
+class SuggestTests(TestCase):
+    """Typeahead suggestions for romanized prefixes and odd parameters"""
+
+    @classmethod
+    def setUpTestData(cls):
+        make_doctor('ডা. রহিমা খাতুন', 'গাইনি ও প্রসূতি বিশেষজ্ঞ', view_count=5)
+        make_doctor('ডা. করিম উদ্দিন', 'মেডিসিন বিশেষজ্ঞ', view_count=9)
+
+    def setUp(self):
+        suggestion_trie.build()
+
+    def labels(self, prefix):
+        return [entry.label for entry in suggestion_trie.lookup(prefix)]
+
+    def test_latin_prefix_is_transliterated(self):
+        self.assertIn('গাইনি ও প্রসূতি বিশেষজ্ঞ', self.labels('ga'))
+        self.assertIn('মেডিসিন বিশেষজ্ঞ', self.labels('medi'))
+        self.assertEqual(self.labels('ga'), self.labels('গা'))
+
+    def test_latin_prefix_uses_synonyms(self):
+        self.assertIn('গাইনি ও প্রসূতি বিশেষজ্ঞ', self.labels('gyne'))
+
+    def test_limit_parameter(self):
+        url = reverse('doctors:suggest')
+        for limit, expected in (('abc', 2), ('0', 1), ('-5', 1), ('1', 1)):
+            with self.subTest(limit=limit):
+                response = self.client.get(url, {'q': 'ডা', 'limit': limit})
+                self.assertEqual(response.status_code, 200)
+                self.assertEqual(len(response.json()['suggestions']), expected)
+
+
+@override_settings(CACHES=LOCMEM_CACHES, SECURE_SSL_REDIRECT=False, STATICFILES_STORAGE=PLAIN_STATICFILES)
+class ConditionalGetTests(TestCase):
+    """304 Not Modified for repeat visits of anonymous pages"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.doctor = make_doctor('ডা. করিম উদ্দিন')
+
+    def revisit(self, url, params=None):
+        etag = self.client.get(url, params)['ETag']
+        return self.client.get(url, params, HTTP_IF_NONE_MATCH=etag)
+
+    def test_not_modified(self):
+        self.assertEqual(self.revisit(reverse('doctors:index')).status_code, 304)
+
+    def test_searches_reach_the_view(self):
+        url = reverse('doctors:index')
+        with mock.patch('doctors.views.record_search_query') as record_search:
+            for _ in range(2):
+                response = self.client.get(url, {'search': 'মেডিসিন'}, HTTP_IF_NONE_MATCH='*')
+                self.assertEqual(response.status_code, 200)
+                self.assertFalse(response.has_header('ETag'))
+        self.assertEqual(record_search.call_count, 2)
+
+    def test_not_modified_profile_is_tracked(self):
+        with mock.patch('doctors.views.record_doctor_view') as record_doctor_view:
+            response = self.revisit(reverse('doctors:detail', args=[self.doctor.pk]))
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(record_doctor_view.call_count, 2)
+        self.assertEqual(record_doctor_view.call_args[0][1].pk, self.doctor.pk)
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class TimelineFallbackTests(TestCase):
+    """The cron keeps the timeline built; a request rebuilds it only when nothing covers today"""
+
+    def setUp(self):
+        cache.clear()
+        self.doctor = make_doctor('ডা. করিম উদ্দিন', is_24_7_available=True)
+        AvailabilityInterval.objects.all().delete()
+
+    def test_missing_timeline_builds_the_horizon(self):
+        # Fresh deploy: migrated, empty timeline, no cron run yet
+        tomorrow = datetime.now() + timedelta(days=1)
+        evening = make_doctor('ডা. জামাল হোসেন', is_emergency_available=True)
+        EmergencySchedule.objects.create(
+            doctor=evening, day_of_week=tomorrow.weekday(), start_time=clock(18), end_time=clock(22)
+        )
+        with self.assertLogs('doctors.availability', 'WARNING'):
+            ensure_timeline()
+        self.assertEqual(AvailabilityInterval.objects.filter(doctor=self.doctor).count(), TIMELINE_DAYS)
+        self.assertNotEqual(evening.get_next_available_time(), 'সময়সূচী নেই')
+
+        count = AvailabilityInterval.objects.count()
+        ensure_timeline()  # covered now - nothing to do
+        self.assertEqual(AvailabilityInterval.objects.count(), count)
+
+    def test_full_rebuild(self):
+        rebuild_timeline()
+        self.assertEqual(AvailabilityInterval.objects.filter(doctor=self.doctor).count(), TIMELINE_DAYS)
+
+
+@override_settings(ALLOWED_HOSTS=['tangaildoctors.com'])
+class DutyBoardStreamTests(SimpleTestCase):
+    """Requests the live duty board refuses without opening a stream"""
+
+    async def call(self, host, method='GET'):
+        scope = {
+            'type': 'http', 'method': method, 'path': live.DUTY_BOARD_PATH, 'query_string': b'',
+            'headers': [(b'host', host.encode('ascii'))],
+        }
+        sent = []
+
+        async def receive():
+            await asyncio.sleep(10)
+
+        async def send(message):
+            sent.append(message)
+
+        await live.duty_board_stream(scope, receive, send)
+        return sent[0]['status']
+
+    async def test_disallowed_host(self):
+        self.assertEqual(await self.call('evil.example.com'), 400)
+
+    async def test_state_not_ready(self):
+        with mock.patch.object(live, 'READY_TIMEOUT', 0.05), \
+                mock.patch.object(live, 'duty_board_state', lambda: time.sleep(0.2)):
+            self.assertEqual(await self.call('tangaildoctors.com'), 503)
+        self.assertFalse(live.broadcaster._subscribers)
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class SearchRollupTests(TestCase):
+    """Rollups group searches on the same normalized term as the sketches"""
+
+    DAY = date(2026, 3, 2)
+
+    def setUp(self):
+        for query in ['gyne '] * 5 + ['gyne', 'Gyne', ' হার্ট  রোগ', '   ']:
+            SearchQuery.objects.create(query=query)
+        SearchQuery.objects.update(searched_at=day_range(self.DAY)[0] + timedelta(hours=10))
+
+    def test_compaction_merges_spelling_variants(self):
+        self.assertEqual(compact_day(self.DAY), (0, 9))
+        self.assertEqual(
+            sorted(SearchQueryDaily.objects.filter(date=self.DAY).values_list('query', 'count')),
+            [('gyne', 7), ('হার্ট রোগ', 1)],
+        )
+
+    def test_daily_stats_merge_spelling_variants(self):
+        stats = aggregate_daily_stats(self.DAY)
+        self.assertEqual((stats.total_searches, stats.unique_searches), (9, 2))
+        self.assertEqual(stats.most_searched_term, 'gyne')
+
+
+class EventBufferTests(SimpleTestCase):
+    """A failed flush keeps its events for the next one"""
+
+    def test_failed_batch_is_retried(self):
+        written = []
+        failures = [RuntimeError('database is down')]
+
+        def writer(batch):
+            if failures:
+                raise failures.pop()
+            written.extend(batch)
+
+        buffer = EventBuffer(writer, batch_size=2)
+        buffer._ensure_thread = lambda: None  # flush by hand
+        for event in range(5):
+            buffer.add(event)
+
+        with self.assertLogs('doctors.tracking', 'ERROR'):
+            self.assertEqual(buffer.flush(), 0)
+        self.assertEqual(len(buffer), 5)
+        self.assertEqual(buffer.flush(), 5)
+        self.assertEqual(written, [0, 1, 2, 3, 4])
+
+    def test_requeue_stays_bounded(self):
+        buffer = EventBuffer(None, batch_size=3, max_pending=4)
+        buffer._ensure_thread = lambda: None
+
+        def writer(batch):
+            # Requests keep queueing while the write hangs, then it fails
+            for event in range(10, 13):
+                buffer.add(event)
+            raise RuntimeError('database is down')
+
+        buffer.writer = writer
+        for event in range(3):
+            buffer.add(event)
+
+        with self.assertLogs('doctors.tracking', 'ERROR'):
+            buffer.flush()
+        # The failed batch goes first; the newest events are shed
+        self.assertEqual(buffer._events, [0, 1, 2, 10])
+        self.assertEqual(buffer.dropped, 2)
@@ -0,0 +1,242 @@
+# -*- coding: utf-8 -*-
+"""
+Buffered analytics writes
+
+Requests hand their events to an EventBuffer and return immediately; a
+background thread writes them in batches. One flush is one bulk INSERT
+plus one UPDATE per affected doctor, instead of an INSERT, a COUNT and a
+row-locking save on every profile hit. Repeat views are filtered in
+memory by a TTLSet before they ever reach the buffer. Flushes also fold
+visitors and search terms into the daily HyperLogLog sketches.
+"""
+import atexit
+import logging
+import threading
+import time
+from collections import Counter, OrderedDict, defaultdict
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import close_old_connections, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .analytics import merge_sketches, normalize_search_term
+from .sketches import HyperLogLog, SpaceSaving
+
+
+logger = logging.getLogger(__name__)
+
+FLUSH_INTERVAL = getattr(settings, 'ANALYTICS_FLUSH_INTERVAL', 5)  # seconds
+BATCH_SIZE = getattr(settings, 'ANALYTICS_BATCH_SIZE', 500)
+MAX_PENDING = getattr(settings, 'ANALYTICS_MAX_PENDING', 10000)
+
+# Repeat views of a profile from the same visitor inside this window count once
+VIEW_DEDUPE_TTL = 5 * 60
+VIEW_DEDUPE_MAX_SIZE = getattr(settings, 'ANALYTICS_DEDUPE_MAX_SIZE', 50000)
+# Share the dedupe window between gunicorn workers through the cache backend
+VIEW_DEDUPE_USE_CACHE = getattr(settings, 'ANALYTICS_DEDUPE_USE_CACHE', False)
+
+
+class TTLSet:
+    """
+    Bounded set whose members expire `ttl` seconds after they were added
+
+    Members are kept in insertion order, which with a fixed TTL is also
+    expiry order, so eviction only ever looks at the oldest entries. When
+    `use_cache` is set the cache backend (cache.add) is the source of truth
+    and the local set just saves round trips for repeats this worker has seen.
+    """
+
+    def __init__(self, ttl, max_size, use_cache=False, key_prefix='ttlset'):
+        self.ttl = ttl
+        self.max_size = max_size
+        self.use_cache = use_cache
+        self.key_prefix = key_prefix
+        self._expires = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _evict(self, now):
+        while self._expires:
+            _, expires = next(iter(self._expires.items()))
+            if expires > now and len(self._expires) <= self.max_size:
+                break
+            self._expires.popitem(last=False)
+
+    def add(self, member):
+        """Add `member`; return False if it was already present (not expired)"""
+        now = time.monotonic()
+        with self._lock:
+            self._evict(now)
+            if member in self._expires:
+                return False
+            if self.use_cache:
+                cache_key = '%s:%s' % (self.key_prefix, ':'.join(map(str, member)) if isinstance(member, tuple) else member)
+                if not cache.add(cache_key, 1, self.ttl):
+                    return False
+            self._expires[member] = now + self.ttl
+            self._evict(now)
+        return True
+
+    def __contains__(self, member):
+        with self._lock:
+            expires = self._expires.get(member)
+        return expires is not None and expires > time.monotonic()
+
+    def __len__(self):
+        return len(self._expires)
+
+
+class EventBuffer:
+    """
+    Thread-safe in-memory queue of events, flushed in batches by a daemon thread
+    `writer` receives a list of events and persists them all or nothing; a
+    batch it fails on goes back into the queue for the next flush.
+    """
+
+    def __init__(self, writer, flush_interval=FLUSH_INTERVAL, batch_size=BATCH_SIZE, max_pending=MAX_PENDING):
+        self.writer = writer
+        self.flush_interval = flush_interval
+        self.batch_size = batch_size
+        self.max_pending = max_pending
+        self._events = []
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._thread = None
+        self.dropped = 0
+
+    def add(self, event):
+        """Queue an event without touching the database"""
+        with self._lock:
+            if len(self._events) >= self.max_pending:
+                # The writer is behind (database down?) - shed load instead of growing forever
+                self.dropped += 1
+                return False
+            self._events.append(event)
+            full = len(self._events) >= self.batch_size
+        self._ensure_thread()
+        if full:
+            self._wakeup.set()
+        return True
+
+    def __len__(self):
+        return len(self._events)
+
+    def _ensure_thread(self):
+        if self._thread is not None and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            self._thread = threading.Thread(target=self._run, name='analytics-flush', daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        while True:
+            self._wakeup.wait(self.flush_interval)
+            self._wakeup.clear()
+            close_old_connections()
+            try:
+                self.flush()
+            finally:
+                close_old_connections()
+
+    def flush(self):
+        """Write all pending events, one batch at a time. Returns the number written."""
+        written = 0
+        with self._flush_lock:
+            while True:
+                with self._lock:
+                    batch = self._events[:self.batch_size]
+                    del self._events[:self.batch_size]
+                if not batch:
+                    break
+                try:
+                    self.writer(batch)
+                except Exception:
+                    logger.exception('Failed to write %d analytics events, retrying later', len(batch))
+                    self._requeue(batch)
+                    break
+                written += len(batch)
+        return written
+
+    def _requeue(self, batch):
+        """Put a failed batch back in front of the queue, within max_pending"""
+        with self._lock:
+            self._events[:0] = batch
+            overflow = len(self._events) - self.max_pending
+            if overflow > 0:
+                # Still bounded while the database is down - shed the newest events
+                del self._events[-overflow:]
+                self.dropped += overflow
+
+
+def truncate_to_hour(value):
+    return value.replace(minute=0, second=0, microsecond=0)
+
+
+def add_hourly_views(counts):
+    """Add {(doctor_id, hour): views} to the DoctorViewHourly rollup"""
+    from .models import DoctorViewHourly
+
+    # Make sure every bucket exists, then increment - safe against other workers
+    DoctorViewHourly.objects.bulk_create(
+        [DoctorViewHourly(doctor_id=doctor_id, hour=hour) for doctor_id, hour in counts],
+        ignore_conflicts=True,
+    )
+    for (doctor_id, hour), count in sorted(counts.items()):
+        DoctorViewHourly.objects.filter(doctor_id=doctor_id, hour=hour).update(views=F('views') + count)
+
+
+def write_doctor_views(views):
+    """
+    Insert a batch of DoctorView rows, bump each doctor's view_count once
+    and add the batch to the hourly rollup
+    """
+    from .models import DailySketch, Doctor, DoctorView
+
+    per_doctor = Counter(view.doctor_id for view in views)
+    per_hour = Counter((view.doctor_id, truncate_to_hour(view.viewed_at)) for view in views)
+    sketches = defaultdict(HyperLogLog)
+    for view in views:
+        visitor_key = getattr(view, 'visitor_key', None)
+        if visitor_key:
+            day = timezone.localdate(view.viewed_at)
+            sketches[(day, view.doctor_id)].add(visitor_key)
+            sketches[(day, None)].add(visitor_key)
+
+    # All or nothing, so a failed batch can be retried without double counting
+    with transaction.atomic():
+        DoctorView.objects.bulk_create(views)
+        # Sorted so concurrent flushes from other workers lock rows in the same order
+        for doctor_id, count in sorted(per_doctor.items()):
+            Doctor.objects.filter(pk=doctor_id).update(view_count=F('view_count') + count)
+        add_hourly_views(per_hour)
+        merge_sketches(DailySketch.VISITORS, sketches)
+
+
+def write_search_events(searches):
+    """Add a batch of recorded SearchQuery rows to the daily search term sketches"""
+    from .models import DailySketch
+
+    sketches = defaultdict(HyperLogLog)
+    top_terms = defaultdict(SpaceSaving)
+    for search in searches:
+        term = normalize_search_term(search.query)
+        if term:
+            key = (timezone.localdate(search.searched_at), None)
+            sketches[key].add(term)
+            top_terms[key].add(term)
+    with transaction.atomic():
+        merge_sketches(DailySketch.SEARCH_TERMS, sketches)
+        merge_sketches(DailySketch.TOP_SEARCH_TERMS, top_terms)
+
+
+view_buffer = EventBuffer(write_doctor_views)
+search_buffer = EventBuffer(write_search_events)
+view_dedupe = TTLSet(VIEW_DEDUPE_TTL, VIEW_DEDUPE_MAX_SIZE, use_cache=VIEW_DEDUPE_USE_CACHE, key_prefix='doctors:viewed')
+
+# Don't lose the last few seconds of events on a graceful worker shutdown
+atexit.register(view_buffer.flush)
+atexit.register(search_buffer.flush)
@@ -11,6 +11,7 @@ urlpatterns = [
     path('doctor/<int:pk>/', views.doctor_detail, name='detail'),
     path('hospitals/', views.hospital_list, name='hospital_list'),
     path('hospital/<str:hospital_name>/', views.hospital_doctors, name='hospital_doctors'),
+    path('suggest/', views.suggest, name='suggest'),
     
     # Authentication URLs
     path('register/', views.register_view, name='register'),
@@ -3,9 +3,18 @@
 Utility functions for doctors app
 """
 from datetime import timedelta
+from django.core.cache import cache
 from django.utils import timezone
+from django.utils.crypto import salted_hmac
 from django.db.models import Count, Q, Sum
 
+from .analytics import top_search_terms
+from .tracking import truncate_to_hour
+
+
+# Popular/trending rankings are cached this many seconds
+RANKING_CACHE_TIMEOUT = 5 * 60
+
 
 def get_client_ip(request):
     """
@@ -20,49 +29,72 @@ def get_client_ip(request):
     return ip
 
 
+def is_ajax(request):
+    """filters.js থেকে আসা AJAX রিকোয়েস্ট কিনা"""
+    return request.headers.get('x-requested-with') == 'XMLHttpRequest'
+
+
+def _visitor_hash(request, salt):
+    ip_address = get_client_ip(request) or ''
+    user_agent = request.META.get('HTTP_USER_AGENT', '')
+    return salted_hmac(salt, f'{ip_address}|{user_agent}', algorithm='sha256').hexdigest()[:32]
+
+
+def get_visitor_id(request):
+    """
+    Anonymous visitor identity for analytics, without cookies or sessions
+    Keyed hash of IP + user agent; the salt rotates daily so ids can't be
+    linked across days or reversed to an IP address
+    """
+    day = timezone.localdate().isoformat()
+    return _visitor_hash(request, f'doctors.visitor.{day}')
+
+
+def get_visitor_key(request):
+    """
+    Stable keyed visitor hash - only ever fed into HyperLogLog sketches,
+    never stored, so unique visitors can be counted across days
+    """
+    return _visitor_hash(request, 'doctors.visitor.sketch')
+
+
 def record_doctor_view(request, doctor):
     """
     Record a doctor profile view
-    Prevents duplicate views from same session within 5 minutes
+    Prevents duplicate views from same visitor within 5 minutes
+    The view is buffered, not written, when this returns
     """
     from .models import DoctorView
+    from .tracking import view_buffer, view_dedupe
     
     # Get IP address
     ip_address = get_client_ip(request)
     
-    # Get or create session key
-    if not request.session.session_key:
-        request.session.create()
-    session_key = request.session.session_key
-    
-    # Check for recent view from same session
-    five_minutes_ago = timezone.now() - timedelta(minutes=5)
-    recent_view = DoctorView.objects.filter(
-        doctor=doctor,
-        session_key=session_key,
-        viewed_at__gte=five_minutes_ago
-    ).exists()
+    # Visitor fingerprint instead of a session - keeps profile pages cookie-less
+    session_key = get_visitor_id(request)
     
-    # Don't record duplicate view
-    if recent_view:
+    # Don't record duplicate view from same visitor within 5 minutes
+    if not view_dedupe.add((doctor.pk, session_key)):
         return None
     
     # Get user agent and referrer
     user_agent = request.META.get('HTTP_USER_AGENT', '')
     referrer = request.META.get('HTTP_REFERER', '')
     
-    # Create view record
-    view = DoctorView.objects.create(
+    # Queue view record - written in batches by the analytics buffer
+    view = DoctorView(
         doctor=doctor,
+        viewed_at=timezone.now(),
         ip_address=ip_address,
         user_agent=user_agent,
         referrer=referrer,
         session_key=session_key
     )
-    
-    # Update doctor view count
-    doctor.view_count = doctor.views.count()
-    doctor.save(update_fields=['view_count'])
+    # Not a model field - goes into the unique visitor sketches on flush
+    view.visitor_key = get_visitor_key(request)
+    if view_buffer.add(view):
+        # Reflect the view on this page; the column is bumped with F() on flush
+        doctor.view_count += 1
     
     return view
 
@@ -72,6 +104,7 @@ def record_search_query(request, query, result_count, category_filter=''):
     Record a search query
     """
     from .models import SearchQuery
+    from .tracking import search_buffer
     
     # Get IP address
     ip_address = get_client_ip(request)
@@ -83,38 +116,74 @@ def record_search_query(request, query, result_count, category_filter=''):
         ip_address=ip_address,
         category_filter=category_filter
     )
+    search_buffer.add(search)
     
     return search
 
 
+def get_top_viewed_doctor_ids(limit=10, days=30):
+    """
+    [(doctor_id, views)] of the most viewed doctors in last N days
+    Answered from the hourly rollup and cached for a few minutes
+    """
+    from .models import DoctorViewHourly
+    
+    cache_key = f'doctors:top_viewed:{days}:{limit}'
+    ranking = cache.get(cache_key)
+    if ranking is None:
+        start_hour = truncate_to_hour(timezone.now() - timedelta(days=days))
+        ranking = list(DoctorViewHourly.objects.filter(
+            hour__gte=start_hour,
+            doctor__is_active=True
+        ).values('doctor').annotate(
+            total=Sum('views')
+        ).order_by('-total', 'doctor').values_list('doctor', 'total')[:limit])
+        cache.set(cache_key, ranking, RANKING_CACHE_TIMEOUT)
+    return ranking
+
+
+def _ranked_doctors(ranking):
+    """Doctor objects of a (doctor_id, views) ranking, in order, with recent_views set"""
+    from .models import Doctor
+    
+    doctors = Doctor.objects.filter(is_active=True).in_bulk([doctor_id for doctor_id, _ in ranking])
+    result = []
+    for doctor_id, views in ranking:
+        doctor = doctors.get(doctor_id)
+        if doctor is not None:
+            doctor.recent_views = views
+            result.append(doctor)
+    return result
+
+
 def get_popular_doctors(limit=10, days=30):
     """
     Get most viewed doctors in last N days
+    Topped up with all-time most viewed doctors when there aren't enough recent views
     """
     from .models import Doctor
     
-    start_date = timezone.now() - timedelta(days=days)
-    
-    return Doctor.objects.filter(
-        is_active=True
-    ).annotate(
-        recent_views=Count('views', filter=Q(views__viewed_at__gte=start_date))
-    ).order_by('-recent_views', '-view_count')[:limit]
+    doctors = _ranked_doctors(get_top_viewed_doctor_ids(limit, days))
+    if len(doctors) < limit:
+        extra = Doctor.objects.filter(is_active=True).exclude(
+            pk__in=[doctor.pk for doctor in doctors]
+        ).order_by('-view_count')[:limit - len(doctors)]
+        for doctor in extra:
+            doctor.recent_views = 0
+            doctors.append(doctor)
+    return doctors
 
 
 def get_popular_searches(limit=10, days=30):
     """
     Get most frequent search queries in last N days
+    Read from the daily top search term sketches (today and the N-1 days before)
     """
-    from .models import SearchQuery
-    
-    start_date = timezone.now() - timedelta(days=days)
-    
-    return SearchQuery.objects.filter(
-        searched_at__gte=start_date
-    ).values('query').annotate(
-        count=Count('id')
-    ).order_by('-count')[:limit]
+    today = timezone.localdate()
+    return [
+        {'query': query, 'count': count}
+        for query, count in top_search_terms(today - timedelta(days=days - 1), today, limit)
+    ]
 
 
 def get_category_stats():
@@ -135,14 +204,4 @@ def get_trending_doctors(limit=10, days=7):
     """
     Get trending doctors (most views in recent days)
     """
-    from .models import Doctor
-    
-    start_date = timezone.now() - timedelta(days=days)
-    
-    return Doctor.objects.filter(
-        is_active=True
-    ).annotate(
-        recent_views=Count('views', filter=Q(views__viewed_at__gte=start_date))
-    ).filter(
-        recent_views__gt=0
-    ).order_by('-recent_views')[:limit]
+    return _ranked_doctors(get_top_viewed_doctor_ids(limit, days))
@@ -0,0 +1,90 @@
+# -*- coding: utf-8 -*-
+"""
+Data version of the public directory pages
+
+The pages only change when the rows below change, so the newest
+timestamp and row count of each model identify what a page was rendered
+from. Signals record the time of every change (deletes and category
+assignments leave no timestamp behind) and drop the cached version.
+"""
+import hashlib
+import uuid
+from collections import namedtuple
+from datetime import datetime, timezone as dt_timezone
+
+from django.core.cache import cache
+from django.db.models import Count, Max
+from django.utils import timezone
+
+
+DATA_VERSION_CACHE_KEY = 'doctors:data_version'
+DATA_CHANGED_AT_CACHE_KEY = 'doctors:data_changed_at'
+
+# Safety net for changes made without signals (queryset.update())
+DATA_VERSION_TIMEOUT = 10 * 60
+
+# Models shown on public pages and the column telling when a row last changed
+TRACKED_MODELS = (
+    ('Doctor', 'updated_at'),
+    ('Category', 'updated_at'),
+    ('Review', 'updated_at'),
+    ('EmergencySchedule', 'updated_at'),
+    ('DoctorLeave', 'created_at'),
+)
+
+DataVersion = namedtuple('DataVersion', ['token', 'last_modified'])
+
+
+def compute_data_version():
+    from . import models
+
+    parts = []
+    last_modified = datetime(2000, 1, 1, tzinfo=dt_timezone.utc)
+    for model_name, field in TRACKED_MODELS:
+        stats = getattr(models, model_name).objects.aggregate(last=Max(field), count=Count('pk'))
+        parts.append(f"{model_name}:{stats['count']}:{stats['last'].isoformat() if stats['last'] else ''}")
+        if stats['last']:
+            last_modified = max(last_modified, stats['last'])
+
+    changed_at = cache.get(DATA_CHANGED_AT_CACHE_KEY)
+    if changed_at:
+        parts.append(changed_at.isoformat())
+        last_modified = max(last_modified, changed_at)
+
+    token = hashlib.md5('|'.join(parts).encode('utf-8')).hexdigest()[:16]
+    return DataVersion(token, last_modified)
+
+
+def data_version():
+    """Current DataVersion(token, last_modified), from the shared cache"""
+    version = cache.get(DATA_VERSION_CACHE_KEY)
+    if version is None:
+        version = compute_data_version()
+        cache.set(DATA_VERSION_CACHE_KEY, version, DATA_VERSION_TIMEOUT)
+    return version
+
+
+def cache_generation(key):
+    """
+    Current generation token stored under `key` (created on first use)
+
+    Tokens are random instead of counters: a generation key that was culled
+    or evicted comes back as a new token, never as one already used by
+    cached entries, and bumping needs no atomic incr().
+    """
+    generation = cache.get(key)
+    if generation is None:
+        generation = uuid.uuid4().hex[:12]
+        cache.add(key, generation, None)
+        generation = cache.get(key, generation)
+    return generation
+
+
+def bump_cache_generation(key):
+    """Start a new generation - entries keyed by the old one are never read again"""
+    cache.set(key, uuid.uuid4().hex[:12], None)
+
+
+def mark_data_changed():
+    cache.set(DATA_CHANGED_AT_CACHE_KEY, timezone.now(), None)
+    cache.delete(DATA_VERSION_CACHE_KEY)
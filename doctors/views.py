@@ -1,4 +1,9 @@
+from django.conf import settings
 from django.shortcuts import render, get_object_or_404, redirect
+from django.http import JsonResponse
+from django.urls import reverse
+from django.utils.cache import patch_cache_control, patch_vary_headers
+from django.utils.http import urlencode
 from django.db.models import Q
 from django.contrib.auth import login, authenticate, logout
 from django.contrib.auth.decorators import login_required
@@ -6,9 +11,55 @@ from django.contrib.auth.forms import UserCreationForm, AuthenticationForm
 from django.contrib import messages
 from django.contrib.admin.views.decorators import staff_member_required
 from .models import Doctor, Favorite, Review, TimeSlot, Appointment, Category
-from .utils import record_doctor_view, record_search_query, get_popular_doctors
+from .utils import record_doctor_view, record_search_query, get_popular_doctors, is_ajax
+from .search import search_doctor_ids
+from .suggest import suggestion_trie, MAX_SUGGESTIONS
+from .pagination import paginate, paginate_ids, AVAILABLE_ORDERING, DOCTOR_ORDERING
+from .page_cache import anonymous_page_cache
+from .live import DUTY_BOARD_PATH
 from datetime import datetime, timedelta, date
 
+
+def listing_json(request, page_obj):
+    """ডাক্তার লিস্টের একটি পেজ - সংক্ষিপ্ত JSON"""
+    results = []
+    for doctor in page_obj.object_list:
+        results.append({
+            'id': doctor.pk,
+            'name': doctor.get_name(),
+            'specialty': doctor.get_clean_specialty(),
+            'hospital': doctor.get_clean_hospital(),
+            'url': reverse('doctors:detail', args=[doctor.pk]),
+            'image': doctor.image.url if doctor.image else None,
+            'is_emergency_available': doctor.is_emergency_available,
+            'is_24_7_available': doctor.is_24_7_available,
+        })
+    return JsonResponse({
+        'results': results,
+        'count': page_obj.count,
+        'has_next': page_obj.has_next,
+        'has_previous': page_obj.has_previous,
+        'next': page_obj.next_querystring if page_obj.has_next else None,
+        'previous': page_obj.previous_querystring if page_obj.has_previous else None,
+    })
+
+
+def render_listing(request, template_name, results_template, context):
+    """
+    ডাক্তার লিস্ট রেন্ডার করে
+    ?format=json হলে JSON, AJAX হলে শুধু রেজাল্ট অংশ (কার্ড/টেবিল + পেজিনেশন),
+    নাহলে পুরো পেজ
+    """
+    if request.GET.get('format') == 'json':
+        response = listing_json(request, context['page_obj'])
+    elif is_ajax(request):
+        response = render(request, results_template, context)
+    else:
+        response = render(request, template_name, context)
+    patch_vary_headers(response, ['X-Requested-With'])
+    return response
+
+@anonymous_page_cache(uncached_params=('search',))
 def index(request):
     """কার্ড ভিউ - সব ডাক্তার দেখাবে"""
     search_query = request.GET.get('search', '')
@@ -16,7 +67,7 @@ def index(request):
     emergency_filter = request.GET.get('emergency', '')
     available_24_7 = request.GET.get('available_24_7', '')
     
-    doctors = Doctor.objects.filter(is_active=True)
+    doctors = Doctor.objects.for_listing(variant='card').filter(is_active=True)
     
     # Emergency filters
     if emergency_filter == 'true':
@@ -27,44 +78,34 @@ def index(request):
     if available_24_7 == 'true':
         doctors = doctors.filter(is_24_7_available=True)
     
-    # সার্চ ফিল্টার
-    if search_query:
-        doctors = doctors.filter(
-            Q(name__icontains=search_query) |
-            Q(specialty__icontains=search_query) |
-            Q(hospital__icontains=search_query) |
-            Q(qualification__icontains=search_query)
-        )
-        # Track search query
-        result_count = doctors.count()
-        record_search_query(request, search_query, result_count, category_filter)
     # ক্যাটেগরি ফিল্টার (dynamic from database)
     if category_filter:
         doctors = doctors.filter(categories__slug=category_filter, categories__is_active=True).distinct()
     
-    # Pagination
-    from django.core.paginator import Paginator, EmptyPage, PageNotAnInteger
-    paginator = Paginator(doctors, 20)  # 20 doctors per page
-    page = request.GET.get('page')
-    try:
-        page_obj = paginator.page(page)
-    except PageNotAnInteger:
-        page_obj = paginator.page(1)
-    except EmptyPage:
-        page_obj = paginator.page(paginator.num_pages)
+    # সার্চ ফিল্টার + Pagination
+    if search_query:
+        search_ids = search_doctor_ids(doctors, search_query)
+        # Track search query
+        record_search_query(request, search_query, len(search_ids), category_filter)
+        page_obj = paginate_ids(request, doctors, search_ids)
+    else:
+        page_obj = paginate(request, doctors, DOCTOR_ORDERING)
+    
+    # AJAX/JSON রিকোয়েস্টে শুধু রেজাল্ট অংশ লাগে - বাকি সেকশন বাদ
+    full_page = not is_ajax(request) and request.GET.get('format') != 'json'
     
     # সব ক্যাটেগরি লিস্ট (from database)
-    categories = Category.objects.filter(is_active=True).order_by('order', 'name')
+    categories = Category.objects.filter(is_active=True).order_by('order', 'name') if full_page else []
     
     # Get popular doctors (only on first page, no search/filter)
     popular_doctors = []
-    if not search_query and not category_filter and not emergency_filter and not available_24_7 and page_obj.number == 1:
+    if full_page and not search_query and not category_filter and not emergency_filter and not available_24_7 and not page_obj.has_previous:
         popular_doctors = get_popular_doctors(limit=5, days=30)
     
     # Get emergency doctors for homepage section
     emergency_doctors = []
-    if not search_query and not category_filter and not emergency_filter and page_obj.number == 1:
-        emergency_doctors = Doctor.objects.filter(
+    if full_page and not search_query and not category_filter and not emergency_filter and not page_obj.has_previous:
+        emergency_doctors = Doctor.objects.for_listing(variant='compact').filter(
             is_active=True,
             is_emergency_available=True
         ).order_by('-view_count')[:6]
@@ -80,41 +121,29 @@ def index(request):
         'popular_doctors': popular_doctors,
         'emergency_doctors': emergency_doctors,
     }
-    return render(request, 'doctors/index.html', context)
+    return render_listing(request, 'doctors/index.html', 'doctors/includes/index_results.html', context)
 
+@anonymous_page_cache(uncached_params=('search',))
 def table_view(request):
     """টেবিল ভিউ - ডাক্তারদের টেবিল ফরম্যাটে দেখাবে"""
     search_query = request.GET.get('search', '')
     category_filter = request.GET.get('category', '')
     
-    doctors = Doctor.objects.filter(is_active=True)
-    # সার্চ ফিল্টার
-    if search_query:
-        doctors = doctors.filter(
-            Q(name__icontains=search_query) |
-            Q(specialty__icontains=search_query) |
-            Q(hospital__icontains=search_query) |
-            Q(qualification__icontains=search_query)
-        )
-        # Track search query
-        result_count = doctors.count()
-        record_search_query(request, search_query, result_count, category_filter)
+    doctors = Doctor.objects.for_listing(variant='table').filter(is_active=True)
     # ক্যাটেগরি ফিল্টার (dynamic)
     if category_filter:
         doctors = doctors.filter(categories__slug=category_filter, categories__is_active=True).distinct()
     
-    # Pagination
-    from django.core.paginator import Paginator, EmptyPage, PageNotAnInteger
-    paginator = Paginator(doctors, 20)
-    page = request.GET.get('page')
-    try:
-        page_obj = paginator.page(page)
-    except PageNotAnInteger:
-        page_obj = paginator.page(1)
-    except EmptyPage:
-        page_obj = paginator.page(paginator.num_pages)
-    # সব ক্যাটেগরি লিস্ট (from database)
-    categories = Category.objects.filter(is_active=True).order_by('order', 'name')
+    # সার্চ ফিল্টার + Pagination
+    if search_query:
+        search_ids = search_doctor_ids(doctors, search_query)
+        # Track search query
+        record_search_query(request, search_query, len(search_ids), category_filter)
+        page_obj = paginate_ids(request, doctors, search_ids)
+    else:
+        page_obj = paginate(request, doctors, DOCTOR_ORDERING)
+    # সব ক্যাটেগরি লিস্ট (from database) - AJAX রেজাল্টে লাগে না
+    categories = Category.objects.filter(is_active=True).order_by('order', 'name') if not is_ajax(request) else []
     context = {
         'doctors': page_obj.object_list,
         'page_obj': page_obj,
@@ -122,8 +151,9 @@ def table_view(request):
         'category_filter': category_filter,
         'categories': categories,
     }
-    return render(request, 'doctors/table.html', context)
+    return render_listing(request, 'doctors/table.html', 'doctors/includes/table_results.html', context)
 
+@anonymous_page_cache(uncached_params=('search',))
 def category_view(request, category_slug):
     """ক্যাটেগরি ভিউ - নির্দিষ্ট ক্যাটেগরির ডাক্তার দেখাবে"""
     # Get category from database
@@ -132,35 +162,22 @@ def category_view(request, category_slug):
     search_query = request.GET.get('search', '')
     
     # Get doctors in this category
-    doctors = Doctor.objects.filter(
+    doctors = Doctor.objects.for_listing(variant='card').filter(
         categories=category,
         is_active=True
     ).distinct()
     
-    # সার্চ ফিল্টার
+    # সার্চ ফিল্টার + Pagination
     if search_query:
-        doctors = doctors.filter(
-            Q(name__icontains=search_query) |
-            Q(specialty__icontains=search_query) |
-            Q(hospital__icontains=search_query)
-        )
+        search_ids = search_doctor_ids(doctors, search_query, fields=('name', 'specialty', 'hospital'))
         # Track search query
-        result_count = doctors.count()
-        record_search_query(request, search_query, result_count, category_slug)
-    
-    # Pagination
-    from django.core.paginator import Paginator, EmptyPage, PageNotAnInteger
-    paginator = Paginator(doctors, 20)
-    page = request.GET.get('page')
-    try:
-        page_obj = paginator.page(page)
-    except PageNotAnInteger:
-        page_obj = paginator.page(1)
-    except EmptyPage:
-        page_obj = paginator.page(paginator.num_pages)
+        record_search_query(request, search_query, len(search_ids), category_slug)
+        page_obj = paginate_ids(request, doctors, search_ids)
+    else:
+        page_obj = paginate(request, doctors, DOCTOR_ORDERING)
     
-    # সব ক্যাটেগরি লিস্ট (from database)
-    categories = Category.objects.filter(is_active=True).order_by('order', 'name')
+    # সব ক্যাটেগরি লিস্ট (from database) - AJAX রেজাল্টে লাগে না
+    categories = Category.objects.filter(is_active=True).order_by('order', 'name') if not is_ajax(request) else []
     
     context = {
         'doctors': page_obj.object_list,
@@ -170,8 +187,38 @@ def category_view(request, category_slug):
         'category_name': category.name,
         'categories': categories,
     }
-    return render(request, 'doctors/category.html', context)
+    return render_listing(request, 'doctors/category.html', 'doctors/includes/category_results.html', context)
+
+def suggest(request):
+    """সার্চ বক্সের জন্য টাইপ-অ্যাহেড সাজেশন (JSON)"""
+    query = request.GET.get('q', '')
+    try:
+        limit = max(1, min(int(request.GET.get('limit', 8)), MAX_SUGGESTIONS))
+    except ValueError:
+        limit = 8
+    
+    suggestions = []
+    for entry in suggestion_trie.lookup(query, limit):
+        if entry.kind == 'doctor':
+            url = reverse('doctors:detail', args=[entry.target])
+        elif entry.kind == 'category':
+            url = reverse('doctors:category', args=[entry.target])
+        elif entry.kind == 'hospital':
+            url = reverse('doctors:hospital_doctors', args=[entry.target])
+        else:
+            url = reverse('doctors:index') + '?' + urlencode({'search': entry.target})
+        suggestions.append({'label': entry.label, 'type': entry.kind, 'url': url})
+    
+    response = JsonResponse({'query': query, 'suggestions': suggestions})
+    patch_cache_control(response, public=True, max_age=60)
+    return response
+
+def record_cached_doctor_view(request, pk):
+    """ক্যাশ থেকে দেখানো প্রোফাইলের ভিউও রেকর্ড হবে"""
+    record_doctor_view(request, Doctor(pk=pk))
 
+
+@anonymous_page_cache(on_hit=record_cached_doctor_view)
 def doctor_detail(request, pk):
     """একক ডাক্তারের বিস্তারিত তথ্য"""
     doctor = get_object_or_404(Doctor, pk=pk, is_active=True)
@@ -198,6 +245,7 @@ def doctor_detail(request, pk):
     return render(request, 'doctors/detail.html', context)
 
 
+@anonymous_page_cache()
 def hospital_list(request):
     """হাসপাতাল তালিকা - প্রতিটি হাসপাতালে কতজন ডাক্তার আছে"""
     from django.db.models import Count, Max
@@ -229,47 +277,40 @@ def hospital_list(request):
     ).order_by('hospital')
     
     # Pagination
-    from django.core.paginator import Paginator, EmptyPage, PageNotAnInteger
-    paginator = Paginator(hospitals, 20)  # 20 hospitals per page
-    page = request.GET.get('page')
-    try:
-        page_obj = paginator.page(page)
-    except PageNotAnInteger:
-        page_obj = paginator.page(1)
-    except EmptyPage:
-        page_obj = paginator.page(paginator.num_pages)
+    page_obj = paginate(request, hospitals, ('hospital',))
+    
+    # Total only on the first page, deeper pages skip the COUNT
+    total_count = page_obj.count if not page_obj.has_previous else None
     
     context = {
         'hospitals': page_obj.object_list,
         'page_obj': page_obj,
+        'total_count': total_count,
         'search_query': search_query,
     }
     return render(request, 'doctors/hospital_list.html', context)
 
 
+@anonymous_page_cache()
 def hospital_doctors(request, hospital_name):
     """নির্দিষ্ট হাসপাতালের সব ডাক্তার"""
-    doctors = Doctor.objects.filter(
+    doctors = Doctor.objects.for_listing(variant='hospital').filter(
         hospital=hospital_name,
         is_active=True
     )
     
-    hospital_address = doctors.first().hospital_address if doctors.exists() else ''
-    
     # Pagination
-    from django.core.paginator import Paginator, EmptyPage, PageNotAnInteger
-    paginator = Paginator(doctors, 20)
-    page = request.GET.get('page')
-    try:
-        page_obj = paginator.page(page)
-    except PageNotAnInteger:
-        page_obj = paginator.page(1)
-    except EmptyPage:
-        page_obj = paginator.page(paginator.num_pages)
+    page_obj = paginate(request, doctors, DOCTOR_ORDERING)
+    
+    hospital_address = page_obj.object_list[0].hospital_address if page_obj.object_list else ''
+    
+    # Total only on the first page, deeper pages skip the COUNT
+    total_count = page_obj.count if not page_obj.has_previous else None
     
     context = {
         'hospital_name': hospital_name,
         'hospital_address': hospital_address,
+        'total_count': total_count,
         'doctors': page_obj.object_list,
         'page_obj': page_obj,
     }
@@ -503,15 +544,7 @@ def my_appointments(request):
         appointments = appointments.filter(status=status_filter)
     
     # Pagination
-    from django.core.paginator import Paginator, EmptyPage, PageNotAnInteger
-    paginator = Paginator(appointments, 10)
-    page = request.GET.get('page')
-    try:
-        page_obj = paginator.page(page)
-    except PageNotAnInteger:
-        page_obj = paginator.page(1)
-    except EmptyPage:
-        page_obj = paginator.page(paginator.num_pages)
+    page_obj = paginate(request, appointments, ('-appointment_date', '-created_at', '-id'), per_page=10)
     
     context = {
         'appointments': page_obj.object_list,
@@ -536,46 +569,55 @@ def cancel_appointment(request, appointment_id):
     return redirect('doctors:my_appointments')
 
 
+@anonymous_page_cache()
 def emergency_doctors(request):
     """জরুরি ডাক্তারদের তালিকা"""
     search_query = request.GET.get('search', '')
-    filter_type = request.GET.get('filter', 'all')  # all, emergency, 24_7
+    filter_type = request.GET.get('filter', 'all')  # all, emergency, 24_7, now
+    sort = request.GET.get('sort', '')  # '' or available (এখন উপলব্ধ আগে)
     
     # Base queryset
-    doctors = Doctor.objects.filter(is_active=True)
+    doctors = Doctor.objects.for_listing(variant='emergency').filter(is_active=True)
     
     # Apply emergency filters
     if filter_type == 'emergency':
         doctors = doctors.filter(is_emergency_available=True)
     elif filter_type == '24_7':
         doctors = doctors.filter(is_24_7_available=True)
-    else:  # all
+    else:  # all, now
         doctors = doctors.filter(Q(is_emergency_available=True) | Q(is_24_7_available=True))
     
-    # Search filter
-    if search_query:
-        doctors = doctors.filter(
-            Q(name__icontains=search_query) |
-            Q(specialty__icontains=search_query) |
-            Q(hospital__icontains=search_query)
-        )
+    # এখন উপলব্ধ - schedules and leaves are checked in SQL
+    available_only = filter_type == 'now'
+    available_first = sort == 'available'
     
-    # Pagination
-    from django.core.paginator import Paginator, EmptyPage, PageNotAnInteger
-    paginator = Paginator(doctors, 20)
-    page = request.GET.get('page')
-    try:
-        page_obj = paginator.page(page)
-    except PageNotAnInteger:
-        page_obj = paginator.page(1)
-    except EmptyPage:
-        page_obj = paginator.page(paginator.num_pages)
+    # Search filter + Pagination
+    if search_query:
+        search_ids = search_doctor_ids(doctors, search_query, fields=('name', 'specialty', 'hospital'))
+        if available_only or available_first:
+            available_ids = set(doctors.with_available_now().filter(
+                available_now=True, pk__in=search_ids
+            ).values_list('pk', flat=True))
+            if available_only:
+                search_ids = [pk for pk in search_ids if pk in available_ids]
+            else:
+                search_ids = sorted(search_ids, key=lambda pk: pk not in available_ids)
+        page_obj = paginate_ids(request, doctors, search_ids)
+    else:
+        if available_only or available_first:
+            doctors = doctors.with_available_now()
+        if available_only:
+            doctors = doctors.filter(available_now=True)
+        page_obj = paginate(request, doctors, AVAILABLE_ORDERING if available_first else DOCTOR_ORDERING)
     
     context = {
         'doctors': page_obj.object_list,
         'page_obj': page_obj,
         'search_query': search_query,
         'filter_type': filter_type,
-        'total_count': doctors.count(),
+        'sort': sort,
+        'total_count': page_obj.count,
+        # লাইভ আপডেট (Server-Sent Events) - শুধু ASGI সার্ভারে
+        'live_url': DUTY_BOARD_PATH if settings.DUTY_BOARD_STREAM else '',
     }
-    return render(request, 'doctors/emergency.html', context)
+    return render_listing(request, 'doctors/emergency.html', 'doctors/includes/emergency_results.html', context)